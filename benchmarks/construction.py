@@ -0,0 +1,18 @@
+"""
+Times building expressions, without executing them.
+"""
+import time
+
+from metadsl_core import *
+
+N = 100_000
+
+items = [Integer.from_int(i) for i in range(N)]
+start = time.perf_counter()
+Vec.create(*items)
+print(f"Vec.create of {N} items: {time.perf_counter() - start:.2f}s")
+
+start = time.perf_counter()
+for i in range(N // 10):
+    Integer.from_int(i) + Integer.from_int(i)
+print(f"{N // 10} additions: {time.perf_counter() - start:.2f}s")
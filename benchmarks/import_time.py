@@ -0,0 +1,60 @@
+"""
+Measures how long it takes to import each package, using `python -X importtime`, and compares it
+against a budget. Each import is done in a fresh interpreter, so nothing is cached between them.
+
+Exits with a non zero status if any package takes longer than its budget.
+"""
+import subprocess
+import sys
+import typing
+
+# The budget for each package, in milliseconds
+BUDGETS = {
+    "metadsl": 100,
+    "metadsl_rewrite": 120,
+    "metadsl_core": 150,
+    "metadsl_llvm": 250,
+    "metadsl_visualize": 200,
+}
+
+# Modules that should only be imported once they are needed
+LAZY = ["IPython", "igraph", "black", "jsonschema"]
+
+REPEAT = 3
+
+
+def import_time(module: str) -> typing.Tuple[float, typing.Dict[str, float]]:
+    """
+    Returns the cumulative import time of the module, in milliseconds, along with the modules it imported.
+    """
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    ).stderr
+    imported: typing.Dict[str, float] = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            imported[name.strip()] = int(cumulative) / 1000
+    return imported[module], imported
+
+
+failed = False
+for module, budget in BUDGETS.items():
+    results = [import_time(module) for _ in range(REPEAT)]
+    time = min(t for t, _ in results)
+    imported = results[0][1]
+    eager = [lazy for lazy in LAZY if lazy in imported]
+    over = time > budget
+    failed = failed or over
+    print(
+        f"{module}: {time:.0f}ms (budget {budget}ms)"
+        + (" OVER BUDGET" if over else "")
+        + (f", imports {', '.join(eager)}" if eager else "")
+    )
+
+sys.exit(1 if failed else 0)
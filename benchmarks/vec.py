@@ -1,6 +1,31 @@
+import sys
+import time
+
+import numpy
+
 from metadsl import *
 from metadsl_core import *
+from metadsl_numpy import *
+from metadsl_rewrite import *
 
 
 N = 11
 print(execute(Converter[Vec[Integer]].convert(tuple(range(N)))))
+
+# Vectors packed into an array can be much larger
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+two = Integer.from_int(2)
+vec = execute(Converter[Vec[Integer]].convert(Int64Array(numpy.arange(N))))
+start = time.perf_counter()
+res = execute(
+    vec.default(Vec[Integer].create())
+    .map(Abstraction[Integer, Integer].from_fn(lambda i: i * two))
+    .drop(Integer.from_int(N // 2))
+    .fold(
+        Integer.from_int(0),
+        Abstraction[Integer, Abstraction[Integer, Integer]].from_fn(
+            lambda acc: Abstraction[Integer, Integer].from_fn(lambda x: acc + x)
+        ),
+    )
+)
+print(f"map, drop and fold of {N} packed items: {time.perf_counter() - start:.2f}s")
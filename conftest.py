@@ -1 +1,6 @@
+import metadsl.normalized
+
 collect_ignore = ["docs/conf.py"]
+
+# Check the integrity of every expression graph after every change in the tests
+metadsl.normalized.DEFAULT_VERIFICATION = "full"
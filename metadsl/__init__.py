@@ -5,11 +5,18 @@ Library to help create DSLs in Python.
 __version__ = "0.4.0"
 
 from .dict_tools import *
+from .digest import *
 from .expressions import *
 from .logging import *
 from .module_tools import *
 from .normalized import *
 
 export_from(
-    __name__, "expressions", "dict_tools", "normalized", "logging", "module_tools"
+    __name__,
+    "expressions",
+    "dict_tools",
+    "digest",
+    "normalized",
+    "logging",
+    "module_tools",
 )
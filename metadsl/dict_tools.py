@@ -2,7 +2,7 @@ import collections.abc
 import dataclasses
 import typing
 
-__all__ = ["safe_merge", "Item", "UnhashableMapping", "HashableMapping"]
+__all__ = ["safe_merge", "Item", "UnhashableMapping", "HashableMapping", "lookup_key"]
 
 T = typing.TypeVar("T")
 V = typing.TypeVar("V")
@@ -18,21 +18,29 @@ class Item(typing.Generic[T, V]):
 class HashableMapping(collections.abc.Mapping, typing.Generic[T, V]):
     """
     Like a dictionary, but immutable and hashable.
+
+    Keys are looked up by their `lookup_key`, like in `UnhashableMapping`.
     """
 
     _items: typing.Tuple[typing.Tuple[T, V], ...]
+    # Mapping of the lookup key of each key to its value
+    _values: typing.Dict[typing.Hashable, V] = dataclasses.field(
+        compare=False, repr=False
+    )
 
     def __init__(self, mapping: typing.Mapping[T, V]):
-        object.__setattr__(self, "_items", tuple((k, v) for k, v in mapping.items()))
+        items = tuple((k, v) for k, v in mapping.items())
+        object.__setattr__(self, "_items", items)
+        values: typing.Dict[typing.Hashable, V] = {}
+        for k, v in items:
+            values.setdefault(lookup_key(k), v)
+        object.__setattr__(self, "_values", values)
 
     def __hash__(self):
         return hash(self._items)
 
     def __getitem__(self, key: T) -> V:
-        for item in self._items:
-            if item[0] == key:
-                return item[1]
-        raise KeyError()
+        return self._values[lookup_key(key)]
 
     def __iter__(self):
         for item in self._items:
@@ -52,49 +60,90 @@ class HashableMapping(collections.abc.Mapping, typing.Generic[T, V]):
 class UnhashableMapping(collections.abc.MutableMapping, typing.Generic[T, V]):
     """
     Like a dictionary, but can have unhashable keys.
+
+    The items are stored by the `lookup_key` of their keys, so unhashable keys, like
+    expressions, are looked up by their digest instead of by `==`. Unhashable values
+    which are not expressions, like lists, have a digest based on their id, so a key
+    containing one is only found with the same object, not with an equal copy of it.
     """
 
-    _items: typing.List[Item[T, V]]
+    # Mapping of the lookup key of each key to its item, in the order they were added
+    _items: typing.Dict[typing.Hashable, Item[T, V]]
 
     def __init__(self, *items: Item[T, V]):
-        self._items = list(items)
+        self._items = {}
+        for item in items:
+            self._items.setdefault(lookup_key(item.key), item)
 
     def __getitem__(self, key: T) -> V:
-        item = self._find_item(key)
-        return item.value
+        return self._items[lookup_key(key)].value
 
     def __setitem__(self, key: T, value: V) -> None:
+        lookup = lookup_key(key)
         try:
-            item = self._find_item(key)
+            self._items[lookup].value = value
         except KeyError:
-            item = Item(key, value)
-            self._items.append(item)
-        else:
-            item.value = value
+            self._items[lookup] = Item(key, value)
 
     def __delitem__(self, key: T) -> None:
-        self._items.remove(self._find_item(key))
-
-    def _find_item(self, key: T) -> Item[T, V]:
-        for item in self._items:
-            if item.key == key:
-                return item
-        raise KeyError()
+        del self._items[lookup_key(key)]
 
     def __iter__(self):
-        for item in self._items:
+        for item in self._items.values():
             yield item.key
 
     def __len__(self):
         return len(self._items)
 
     def __str__(self):
-        return "{" + ", ".join(f"{item.key}={item.value}" for item in self._items) + "}"
+        return (
+            "{"
+            + ", ".join(f"{item.key}={item.value}" for item in self._items.values())
+            + "}"
+        )
 
     def __repr__(self):
         return f"UnhashableMapping({str(self)})"
 
 
+@dataclasses.dataclass(frozen=True)
+class DigestKey:
+    """
+    The lookup key for an unhashable value, which is never equal to a hashable one.
+    """
+
+    digest: str
+
+
+def lookup_key(key: object) -> typing.Hashable:
+    """
+    Returns the key to store a value under in a dict.
+
+    This is the key itself if it is hashable, or else its digest. So, unhashable keys
+    like expressions are the same if they have the same digest, which is what we use to
+    dedupe expressions in a graph as well. Other unhashable values have a digest based on
+    their id, so they are only the same if they are the same object. This is also true
+    for them inside of expressions, so two expressions with equal, but different, lists
+    as args have different keys, even though they are equal.
+
+    >>> lookup_key(1)
+    1
+    >>> x, y = [1], [1]
+    >>> lookup_key(x) == lookup_key(x), lookup_key(x) == lookup_key(y)
+    (True, False)
+    """
+    if type(key).__hash__ is not None:
+        try:
+            hash(key)
+        except TypeError:
+            pass
+        else:
+            return key
+    from .digest import digest
+
+    return DigestKey(digest(key))
+
+
 def safe_merge(
     *mappings: typing.Mapping[T, V],
     dict_constructor: typing.Type[typing.MutableMapping] = dict,
@@ -0,0 +1,251 @@
+"""
+Structural digests of expressions, which are deterministic across processes.
+
+The digest of an expression is computed from the digest of its function and of its children,
+so it is cached on the expression and only recomputed when it is changed.
+"""
+from __future__ import annotations
+
+import dataclasses
+import enum
+import functools
+import hashlib
+import sys
+import types
+import typing
+
+from .dict_tools import *
+from .expressions import *
+
+__all__ = ["digest", "digest_value", "hash_value", "expression_digest"]
+
+Index = typing.Union[int, str]
+
+
+@functools.singledispatch
+def hash_value(value: object) -> int:
+    """
+    Computes some hash for a value that should be stable. Either use the built in hash, or if we cannot
+    (like the object is mutable) then use the id.
+
+    It's a single dispatch function so that you can register custom hashes for objects you don't control.
+    Any value with a custom hash registered here will use it in its digest as well.
+    """
+    try:
+        return hash((type(value), value))
+    except TypeError:
+        return hash((type(value), id(value)))
+
+
+def _combine(*parts: str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        encoded = part.encode("utf-8", "surrogatepass")
+        # Prefix each part with its length, so that different parts never end up with the same bytes
+        h.update(len(encoded).to_bytes(8, "little"))
+        h.update(encoded)
+    return h.hexdigest()
+
+
+def digest(value: object) -> str:
+    """
+    Returns the digest of an expression or value.
+
+    For expressions, this is cached on the expression.
+
+    >>> digest(1) == digest(1)
+    True
+    >>> digest(1) == digest(True) or digest(1) == digest(1.0)
+    False
+    """
+    if not isinstance(value, Expression):
+        return digest_value(value)
+    cached = getattr(value, "_digest", None)
+    if cached is not None:
+        return cached
+    return expression_digest(value, _children_digests(value))
+
+
+def _children_digests(expr: Expression) -> typing.Iterable[typing.Tuple[Index, str]]:
+    for i, arg in enumerate(expr.args):
+        yield i, digest(arg)
+    for k, v in expr.kwargs.items():
+        yield k, digest(v)
+
+
+def expression_digest(
+    expr: Expression, children: typing.Iterable[typing.Tuple[Index, str]]
+) -> str:
+    """
+    Computes the digest of an expression from the digests of its children, and caches it
+    on the expression.
+    """
+    parts = ["Expression", _function_digest(expr.function)]
+    # Sort the args by position, then the kwargs by name
+    for index, child in sorted(
+        children, key=lambda item: (isinstance(item[0], str), item[0])
+    ):
+        parts.append(str(index))
+        parts.append(child)
+    res = _combine(*parts)
+    object.__setattr__(expr, "_digest", res)
+    return res
+
+
+def _function_digest(fn: typing.Callable) -> str:
+    try:
+        return _cached_function_digest(fn)
+    except TypeError:
+        return digest_value(fn)
+
+
+@functools.lru_cache(maxsize=1024)
+def _cached_function_digest(fn: typing.Callable) -> str:
+    return digest_value(fn)
+
+
+def _qualified_name(value: typing.Any) -> str:
+    module = getattr(value, "__module__", None)
+    qualname = getattr(value, "__qualname__", "") or getattr(value, "__name__", "")
+    name = f"{module}.{qualname}"
+    # Objects defined in a function, lambdas, or objects which have been redefined since, can have the
+    # same name but be different, so use their ids as well
+    if not _is_importable(value, module, qualname):
+        name += f"@{id(value)}"
+    return name
+
+
+def _is_importable(value: object, module: typing.Optional[str], qualname: str) -> bool:
+    """
+    Returns whether the value is what you get by looking up its name in its module, possibly
+    after unwrapping decorators.
+    """
+    obj: object = sys.modules.get(module or "")
+    for part in qualname.split("."):
+        obj = getattr(obj, "__dict__", {}).get(part)
+        if obj is None:
+            return False
+    # Unwrap any decorators, like `expression`, `classmethod` or `property`
+    for _ in range(10):
+        if obj is value:
+            return True
+        obj = next(
+            (
+                getattr(obj, attr)
+                for attr in ("__wrapped__", "__func__", "fget")
+                if getattr(obj, attr, None) is not None
+            ),
+            None,
+        )
+    return False
+
+
+@functools.singledispatch
+def digest_value(value: object) -> str:
+    """
+    Returns a digest for a value, which should be equal for equal values.
+
+    It is deterministic across processes for builtin immutable values, types, functions defined
+    at the top level of a module, enums, and hashable dataclasses of these. For other values, it
+    falls back to `hash_value`, which can depend on the process.
+
+    It's a single dispatch function so that you can register custom digests for objects you don't control.
+    """
+    hash_fn = hash_value.dispatch(type(value))
+    # Dataclasses compared by identity, with `eq=False`, are hashed by their id instead
+    if (
+        hash_fn is hash_value.dispatch(object)
+        and dataclasses.is_dataclass(value)
+        and value.__dataclass_params__.eq  # type: ignore
+    ):
+        try:
+            hash(value)
+        except TypeError:
+            pass
+        else:
+            return _combine(
+                _qualified_name(type(value)),
+                *(
+                    digest(getattr(value, field.name))
+                    for field in dataclasses.fields(value)
+                    if (field.compare if field.hash is None else field.hash)
+                ),
+            )
+    return _combine("hash", _qualified_name(type(value)), str(hash_fn(value)))
+
+
+@digest_value.register
+def _digest_expression(value: Expression) -> str:
+    return digest(value)
+
+
+@digest_value.register(type(None))
+@digest_value.register(bool)
+@digest_value.register(int)
+@digest_value.register(float)
+@digest_value.register(complex)
+@digest_value.register(str)
+def _digest_builtin(value: object) -> str:
+    return _combine(type(value).__name__, repr(value))
+
+
+@digest_value.register
+def _digest_bytes(value: bytes) -> str:
+    return _combine("bytes", value.hex())
+
+
+@digest_value.register
+def _digest_tuple(value: tuple) -> str:
+    return _combine(_qualified_name(type(value)), *map(digest, value))
+
+
+@digest_value.register
+def _digest_frozenset(value: frozenset) -> str:
+    return _combine("frozenset", *sorted(map(digest, value)))
+
+
+@digest_value.register
+def _digest_hashable_mapping(value: HashableMapping) -> str:
+    return _combine(
+        "HashableMapping", *(_combine(digest(k), digest(v)) for k, v in value.items())
+    )
+
+
+@digest_value.register
+def _digest_enum(value: enum.Enum) -> str:
+    return _combine(_qualified_name(type(value)), value.name)
+
+
+@digest_value.register(type)
+@digest_value.register(types.FunctionType)
+@digest_value.register(types.BuiltinFunctionType)
+def _digest_named(value: typing.Any) -> str:
+    return _combine(type(value).__name__, _qualified_name(value))
+
+
+@digest_value.register(classmethod)
+@digest_value.register(staticmethod)
+def _digest_method_descriptor(value: typing.Any) -> str:
+    return _combine(type(value).__name__, digest(value.__func__))
+
+
+@digest_value.register
+def _digest_property(value: property) -> str:
+    return _combine("property", digest(value.fget))
+
+
+@digest_value.register
+def _digest_typevar(value: typing.TypeVar) -> str:  # type: ignore
+    return _combine("TypeVar", _qualified_name(value))
+
+
+@digest_value.register(typing._GenericAlias)  # type: ignore
+def _digest_generic_alias(value: typing.Any) -> str:
+    return _combine(
+        "GenericAlias", digest(value.__origin__), *map(digest, value.__args__)
+    )
+
+
+@digest_value.register(typing._SpecialForm)  # type: ignore
+def _digest_special_form(value: typing.Any) -> str:
+    return _combine("SpecialForm", repr(value))
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import dataclasses
+import typing
+
+import pytest
+
+from .digest import *
+from .expressions import *
+from .expressions_test import TEST_EXPRESSIONS
+
+
+@expression
+def a(e: typing.Any) -> typing.Any:
+    ...
+
+
+@expression
+def b(e: typing.Any) -> typing.Any:
+    ...
+
+
+@expression
+def kw(**kwargs: typing.Any) -> typing.Any:
+    ...
+
+
+@pytest.mark.parametrize("expr", TEST_EXPRESSIONS)
+def test_equal_expressions(expr):
+    assert digest(expr) == digest(clone_expression(expr))
+
+
+def test_deterministic():
+    """
+    Digests of builtin values should not depend on the process.
+    """
+    assert digest((1, "a", None, 2.5)) == "6e27222e73c6792ddcd2c53a8629af99"
+
+
+def test_different():
+    assert digest(a(1)) != digest(b(1))
+    assert digest(a(1)) != digest(a(True))
+    assert digest(a(1)) != digest(a(a(1)))
+    assert digest(kw(x=1, y=2)) == digest(kw(y=2, x=1))
+    assert digest(kw(x=1, y=2)) != digest(kw(x=2, y=1))
+
+
+def test_identity_dataclasses():
+    @dataclasses.dataclass(eq=False)
+    class Unique:
+        pass
+
+    @dataclasses.dataclass(frozen=True)
+    class Value:
+        x: int
+
+    first, second = Unique(), Unique()
+    assert digest(first) == digest(first)
+    assert digest(first) != digest(second)
+    assert digest(Value(1)) == digest(Value(1))
+
+
+def test_local_functions():
+    def create():
+        @expression
+        def local() -> typing.Any:
+            ...
+
+        return local
+
+    assert digest(create()()) != digest(create()())
+
+
+def test_cached():
+    expr = a(b(1))
+    res = digest(expr)
+    assert expr._digest == res  # type: ignore
+
+    expr.args = [2]
+    assert not hasattr(expr, "_digest")
+    assert digest(expr) == digest(a(2))
+
+
+def test_equal_by_digest():
+    expr, other = a(b(1)), a(b(1))
+    assert expr is not other
+    digest(expr), digest(other)
+    assert expr == other
+    different = a(b(2))
+    digest(different)
+    assert expr != different
+
+
+@pytest.mark.parametrize(
+    "left, right", [(a(2.0), a(2)), (a([1]), a([1])), (b(a(1)), b(a(1.0)))]
+)
+def test_equal_values_by_digest(left, right):
+    """
+    Expressions with equal values, that have different digests, should still be equal
+    after their digests are computed.
+    """
+    assert left == right
+    digest(left), digest(right)
+    assert left == right
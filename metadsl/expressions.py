@@ -2,11 +2,14 @@ from __future__ import annotations
 
 import dataclasses
 import itertools
+import types
 import typing
+import weakref
 
 import typing_inspect
 
 from .typing_tools import *
+from .typing_tools import GenericCheckType
 
 __all__ = [
     "Expression",
@@ -15,15 +18,33 @@ __all__ = [
     "IteratedPlaceholder",
     "create_iterated_placeholder",
     "clone_expression",
+    "copy_expression",
+    "copy_mutable",
+    "MutableExpression",
+    "cached_annotation",
 ]
 
 T = typing.TypeVar("T")
 T_expression = typing.TypeVar("T_expression", bound="Expression")
 CALLABLE = typing.TypeVar("CALLABLE", bound=typing.Callable)
 
+# Shared by all expressions without kwargs, so they don't each need their own empty dict
+EMPTY_KWARGS: typing.Mapping[str, object] = types.MappingProxyType({})
 
-@dataclasses.dataclass(eq=False, repr=False)
-class Expression(GenericCheck):
+
+class ExpressionType(GenericCheckType):
+    """
+    Metaclass for expressions, which gives every subclass empty `__slots__`, unless it defines its own,
+    so that expressions don't have an instance `__dict__`.
+    """
+
+    def __new__(mcs, name, bases, namespace, **kwargs):
+        namespace.setdefault("__slots__", ())
+        return super().__new__(mcs, name, bases, namespace, **kwargs)
+
+
+@dataclasses.dataclass(eq=False, repr=False, init=False)
+class Expression(GenericCheck, metaclass=ExpressionType):
     """
     Top level object.
     Subclass this type and provide relevent methods for your type. Do not add any fields.
@@ -40,9 +61,45 @@ class Expression(GenericCheck):
     then this should be a PlaceholderExpression of that type.
     """
 
+    __slots__ = (
+        "function",
+        "args",
+        "kwargs",
+        "_digest",
+        "_annotations",
+        "__orig_class__",
+        "__weakref__",
+    )
+
     function: typing.Callable
     args: typing.List[object]
-    kwargs: typing.Dict[str, object]
+    kwargs: typing.Mapping[str, object]
+
+    def __init__(
+        self,
+        function: typing.Callable,
+        args: typing.List[object],
+        kwargs: typing.Mapping[str, object],
+    ) -> None:
+        # Skip our `__setattr__`, since there is no digest to invalidate yet
+        object.__setattr__(self, "function", function)
+        object.__setattr__(self, "args", args)
+        object.__setattr__(self, "kwargs", kwargs or EMPTY_KWARGS)
+
+    def __setattr__(self, name: str, value: object) -> None:
+        # Changing the expression invalidates its cached digest and annotations, and it is
+        # no longer returned when creating an expression equal to what it was.
+        # If its args or kwargs are mutated in place instead, `_digest` must be updated manually.
+        if name in _FIELDS:
+            _unintern(self)
+            for cached in ("_digest", "_annotations"):
+                try:
+                    object.__delattr__(self, cached)
+                except AttributeError:
+                    pass
+            if name == "kwargs" and not value:
+                value = EMPTY_KWARGS
+        object.__setattr__(self, name, value)
 
     def __str__(self):
         arg_strings = (str(arg) for arg in self.args)
@@ -62,7 +119,7 @@ class Expression(GenericCheck):
 
     def __repr__(self):
         return (
-            f"{self._type_str}({self.function}, {repr(self.args)}, {repr(self.kwargs)})"
+            f"{self._type_str}({self.function}, {repr(self.args)}, {repr(dict(self.kwargs))})"
         )
 
     def _map(
@@ -93,8 +150,16 @@ class Expression(GenericCheck):
         return new_expr
 
     def __eq__(self, value) -> bool:
+        if self is value:
+            return True
         if not isinstance(value, Expression):
             return False
+        # If both digests are already computed and are the same, they are equal without
+        # recursing. Different digests don't mean they are different though, since the
+        # digest tells apart values that are equal, like `1` and `1.0`, or two lists.
+        digest = getattr(self, "_digest", None)
+        if digest is not None and digest == getattr(value, "_digest", None):
+            return True
 
         return (
             self.function == value.function
@@ -104,9 +169,79 @@ class Expression(GenericCheck):
 
 
 def clone_expression(expr: T) -> T:
-    if isinstance(expr, Expression):
-        return expr._map(clone_expression)  # type: ignore
-    return expr
+    """
+    Returns a copy of the expression and all of its children. Children which are shared
+    in the expression are shared in the copy as well.
+    """
+    # Mapping of the ids of the expressions copied so far to their copies
+    clones: typing.Dict[int, object] = {}
+
+    def clone(value: T) -> T:
+        if not isinstance(value, Expression):
+            return value
+        try:
+            return typing.cast(T, clones[id(value)])
+        except KeyError:
+            res = clones[id(value)] = value._map(clone)
+            return typing.cast(T, res)
+
+    return clone(expr)
+
+
+def copy_expression(expr: T_expression) -> T_expression:
+    """
+    Returns a new expression with the same function, args and kwargs, which are not copied.
+    """
+    return expr._map(_identity)
+
+
+def _identity(value: T) -> T:
+    return value
+
+
+_FIELDS = frozenset(field.name for field in dataclasses.fields(Expression))
+
+
+class MutableExpression(Expression):
+    """
+    An expression which can be changed in place after it is created, like with `__setitem__`.
+
+    All other expressions are never changed once they are created, so they are shared by the
+    expressions created from them. Mutable expressions are copied instead when they are passed
+    to another expression, so that changing them later does not change that one.
+    """
+
+
+def cached_annotation(
+    expr: Expression, key: str, compute: typing.Callable[[Expression], T]
+) -> T:
+    """
+    Returns `compute(expr)`, caching it on the expression under `key`.
+
+    Like the digest, this is only valid as long as the expression does not change, which
+    is always the case unless it is a mutable expression, so those are never cached.
+    Any expressions made from it, like when replacing its children in a graph, start
+    with no annotations.
+    """
+    if isinstance(expr, MutableExpression):
+        return compute(expr)
+    annotations: typing.Optional[typing.Dict[str, typing.Any]] = getattr(
+        expr, "_annotations", None
+    )
+    if annotations is None:
+        annotations = {}
+        object.__setattr__(expr, "_annotations", annotations)
+    try:
+        return annotations[key]
+    except KeyError:
+        res = annotations[key] = compute(expr)
+        return res
+
+
+def copy_mutable(value: T) -> T:
+    if isinstance(value, MutableExpression):
+        return typing.cast(T, copy_expression(value))
+    return value
 
 
 class PlaceholderExpression(Expression, OfType[T], typing.Generic[T]):
@@ -132,11 +267,69 @@ def extract_expression_type(t: typing.Type) -> typing.Type[Expression]:
 T_callable = typing.TypeVar("T_callable", bound=typing.Callable)
 
 
+# Types of leaf values which are only equal to values of the same type if they are the same value
+INTERNED_TYPES = frozenset({int, str, bool, bytes, type(None), type})
+
+# Expressions whose args are all leaf values, so that creating them again returns the same object
+_interned: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+
+
 def wrapper(fn, args, kwargs, return_type):
     expr_return_type = extract_expression_type(return_type)
-    # Clone expression when returning it, so if if we mutate child expression
-    # those one won't be mutated
-    return clone_expression(expr_return_type(fn, list(args), kwargs))
+    key = intern_key(fn, args, kwargs, expr_return_type)
+    if key is not None:
+        try:
+            return _interned[key]
+        except KeyError:
+            pass
+        except TypeError:
+            # The function or type isn't hashable
+            key = None
+    # Expressions are not changed once they are created, so we can share the args instead of
+    # copying them, besides any mutable ones.
+    expr = expr_return_type(
+        fn,
+        [copy_mutable(arg) for arg in args],
+        {k: copy_mutable(v) for k, v in kwargs.items()},
+    )
+    if key is not None:
+        _interned[key] = expr
+    return expr
+
+
+def _unintern(expr: Expression) -> None:
+    """
+    Stops returning this expression when creating an equal one, because it is about to be changed.
+    """
+    key = intern_key(
+        expr.function,
+        expr.args,
+        expr.kwargs,
+        getattr(expr, "__orig_class__", type(expr)),
+    )
+    try:
+        if key is not None and _interned.get(key) is expr:
+            del _interned[key]
+    except TypeError:
+        pass
+
+
+def intern_key(
+    fn: typing.Callable,
+    args: typing.Sequence[object],
+    kwargs: typing.Mapping[str, object],
+    return_type: typing.Type[Expression],
+) -> typing.Optional[typing.Hashable]:
+    """
+    Returns the key to intern an expression by, if it has no kwargs and all of its args are leaf values,
+    otherwise None.
+    """
+    if kwargs or not all(type(arg) in INTERNED_TYPES for arg in args):
+        return None
+    if issubclass(return_type, MutableExpression):
+        return None
+    # Include the type of each arg, since `1 == True`
+    return (fn, return_type, tuple((type(arg), arg) for arg in args))
 
 
 def expression(fn: T_callable) -> T_callable:
@@ -139,3 +139,83 @@ U = typing.TypeVar("U")
 def test_clone_expression_generic():
     assert clone_expression(Generic[T].create()) == Generic[T].create()
     assert clone_expression(Generic[U].create()) == Generic[U].create()
+
+
+def test_clone_expression_shared():
+    x = subclass_fn(1)
+    for _ in range(8):
+        x = fn(x, x)
+    cloned = clone_expression(x)
+    assert cloned == x
+    assert cloned is not x
+    assert cloned.args[0] is cloned.args[1]
+
+
+class Mutable(MutableExpression):
+    def set(self, value: int) -> None:
+        self.args = [value]
+
+
+@expression
+def mutable_create(a: int) -> Mutable:
+    ...
+
+
+def test_shares_args():
+    x = value_fn(1)
+    assert fn(x, x).args[0] is x
+
+    m = mutable_create(1)
+    res = fn(m, m)
+    m.set(2)
+    assert res == fn(mutable_create(1), mutable_create(1))
+
+
+def test_compact():
+    expr = Generic[int].create()
+    assert not hasattr(expr, "__dict__")
+    assert expr.kwargs is value_fn(1).kwargs
+    assert repr(value_fn(1)).endswith("[1], {})")
+
+
+def test_interned():
+    assert value_fn(1) is value_fn(1)
+    assert value_fn(1) is not value_fn(True)
+    assert Generic[int].create() is Generic[int].create()
+    other: object = Generic[str].create()
+    assert Generic[int].create() is not other
+    assert mutable_fn([1]) is not mutable_fn([1])
+    assert mutable_create(1) is not mutable_create(1)
+
+
+def test_interned_changed():
+    """
+    Changing an interned expression should not change the ones created after it.
+    """
+    expr = value_fn(1)
+    expr.args = [5]
+    assert value_fn(1).args == [1]
+    assert value_fn(1) is value_fn(1)
+    assert value_fn(5) is not expr
+
+
+def test_cached_annotation():
+    calls = []
+
+    def compute(expr: Expression) -> int:
+        calls.append(expr)
+        return len(expr.args)
+
+    expr = fn(value_fn(1), value_fn(2))
+    assert cached_annotation(expr, "n", compute) == 2
+    assert cached_annotation(expr, "n", compute) == 2
+    assert calls == [expr]
+
+    expr.args = [value_fn(1)]
+    assert cached_annotation(expr, "n", compute) == 1
+    assert len(calls) == 2
+
+    m = mutable_create(1)
+    cached_annotation(m, "n", compute)
+    cached_annotation(m, "n", compute)
+    assert len(calls) == 4
@@ -3,7 +3,30 @@ import logging
 import dataclasses
 import typing
 
-__all__ = ["toggle_debug_logging", "CaptureLogging"]
+__all__ = [
+    "toggle_debug_logging",
+    "CaptureLogging",
+    "Tracing",
+    "tracing",
+    "call_traced",
+]
+
+T = typing.TypeVar("T")
+
+
+@dataclasses.dataclass
+class Tracing:
+    """
+    Whether to log and capture debug messages while executing.
+
+    When it's disabled, the hot paths only check `tracing.enabled`, instead of swapping logging
+    handlers and calling the logger for every attempted match.
+    """
+
+    enabled: bool = False
+
+
+tracing = Tracing()
 
 
 def metadsl_filter(record: logging.LogRecord) -> bool:
@@ -18,6 +41,7 @@ handler.addFilter(metadsl_filter)
 
 
 def toggle_debug_logging(enabled: bool) -> None:
+    tracing.enabled = enabled
     logging.basicConfig(  # type: ignore
         level=logging.DEBUG if enabled else logging.WARNING,
         force=True,
@@ -61,3 +85,16 @@ class CaptureLogging:
 
     def __exit__(self, et, ev, tb):
         logging.root.handlers = self.old_handlers
+
+
+def call_traced(fn: typing.Callable[..., T], *args: object) -> typing.Tuple[T, str]:
+    """
+    Calls the function with the args, returning its result and the logs captured during the call.
+
+    The logs are only captured if tracing is enabled, otherwise they are empty.
+    """
+    if not tracing.enabled:
+        return fn(*args), ""
+    with CaptureLogging() as logs:
+        res = fn(*args)
+    return res, "\n".join(logs)
@@ -1,162 +1,375 @@
 """
 Normalized expressions, for deduping and single replacements.
 """
+
 from __future__ import annotations
+import collections
 import dataclasses
 import typing
 import itertools
-import collections
-import functools
-import IPython.core.display
-import igraph
 
+from .digest import *
 from .expressions import *
 
+if typing.TYPE_CHECKING:
+    import igraph
 
 __all__ = [
     "ExpressionReference",
     "Children",
     "Hash",
-    "hash_value",
+    "Verification",
 ]
 
 Hash = typing.NewType("Hash", str)
+Index = typing.Union[int, str]
+
+# How often to check the integrity of the graph after it is changed:
+# never ("off"), after every `SAMPLE_INTERVAL`th change ("sampled") or after every change ("full")
+Verification = typing.Literal["off", "sampled", "full"]
 
+# Level used for graphs that don't specify one. The tests set this to "full".
+DEFAULT_VERIFICATION: Verification = "off"
+SAMPLE_INTERVAL = 64
 
-class Graph(igraph.Graph):
+
+class Node:
+    """
+    A vertex in the graph, for one unique expression.
     """
-    Graph of all expression
 
+    __slots__ = ("hash", "expression", "children", "parents", "order")
+
+    def __init__(self, hash_: Hash, expression: object, order: int):
+        # Hash of the expression, or None while it is being re-hashed
+        self.hash: typing.Optional[Hash] = hash_
+        self.expression = expression
+        # Mapping of the index of each arg or kwarg to its node
+        self.children: typing.Dict[Index, Node] = {}
+        # Mapping of each parent to the number of its args and kwargs which are this node
+        self.parents: typing.Dict[Node, int] = {}
+        # Increasing number for when this node was added to the graph
+        self.order = order
+
+    def __repr__(self):
+        return f"Node({self.hash})"
 
 
-    Vertex attributes:
-    * `name`: string of hash of expression or None if not computed yet
-    * `expression`: expression object
+class Graph:
+    """
+    Graph of all expression, where each unique expression is stored once, as a `Node`.
 
-    Edge Attributes:
-    * `index`: int or string
+    The nodes keep track of both their children and their parents, so replacing a node only
+    has to visit its ancestors.
     """
 
-    def __init__(self, expr: object):
-        super().__init__(directed=True)
+    def __init__(
+        self, expr: object, verification: typing.Optional[Verification] = None
+    ):
+        self.verification = verification or DEFAULT_VERIFICATION
+        self._n_changes = 0
+        self._n_added = 0
+        # Mapping of each hash to its node
+        self._nodes: typing.Dict[Hash, Node] = {}
+        # All the nodes, in the order they were added
+        self._ordered: typing.Dict[Node, None] = {}
+
+        self.root = self.fully_add_expression(expr)
+        self.verify()
 
-        self.fully_add_expression(expr, None)
-        self.assert_integrity()
+    def __len__(self) -> int:
+        return len(self._ordered)
+
+    def __iter__(self) -> typing.Iterator[Node]:
+        return iter(self._ordered)
 
     def _repr_svg_(self):
         return self.plot_custom()._repr_svg_()
 
+    def to_igraph(self) -> igraph.Graph:
+        """
+        Returns a copy of this graph as an igraph graph, which needs igraph to be installed.
+
+        Vertex attributes:
+        * `name`: string of hash of expression
+        * `expression`: expression object
+
+        Edge Attributes:
+        * `index`: int or string
+        """
+        import igraph
+
+        graph = igraph.Graph(directed=True)
+        nodes = list(self._ordered)
+        indices = {node: i for i, node in enumerate(nodes)}
+        graph.add_vertices(
+            len(nodes),
+            attributes={
+                "name": [node.hash for node in nodes],
+                "expression": [node.expression for node in nodes],
+            },
+        )
+        edges = [
+            (i, indices[child], index)
+            for i, node in enumerate(nodes)
+            for index, child in node.children.items()
+        ]
+        graph.add_edges(
+            [(source, target) for source, target, _ in edges],
+            attributes={"index": [index for _, _, index in edges]},
+        )
+        return graph
+
     def plot_custom(self):
+        import igraph
+
+        graph = self.to_igraph()
         return igraph.plot(
-            self,
-            layout=self.layout_sugiyama(),
+            graph,
+            layout=graph.layout_sugiyama(),
             vertex_label=[
                 f'{v.index}: {v["expression"].function if isinstance(v["expression"], Expression) else v["expression"]}'
-                for v in self.vs
+                for v in graph.vs
             ],
-            edge_label=self.es["index"],
+            edge_label=graph.es["index"],
             # vertex_shape="hidden",
         )
 
-    def fully_add_expression(
-        self,
-        expr: object,
-        replace: typing.Optional[typing.Tuple[Hash, object]],
-        *parent_ids: int,
-    ) -> Hash:
+    def fully_add_expression(self, expr: object, *parent_ids: int) -> Node:
+        """
+        Adds the expression and all of its children to the graph, reusing any nodes
+        that already exist with the same hash.
+        """
         # should never be a child of one of its parents, or else we have a cycle
         assert id(expr) not in parent_ids
-        children = frozenset(
-            (
-                index,
-                self.fully_add_expression(
-                    child_expression, replace, id(expr), *parent_ids
-                ),
-            )
+        # If we already know the hash of this expression, and it's in the graph, so are all of its children
+        cached_hash = (
+            getattr(expr, "_digest", None) if isinstance(expr, Expression) else None
+        )
+        if cached_hash is not None and cached_hash in self._nodes:
+            return self._nodes[cached_hash]
+        children = [
+            (index, self.fully_add_expression(child_expression, id(expr), *parent_ids))
             for index, child_expression in expression_children(expr)
+        ]
+        child_hashes = [
+            (index, typing.cast(Hash, child.hash)) for index, child in children
+        ]
+        if cached_hash is None:
+            cached_hash = compute_hash(expr, child_hashes)
+            if cached_hash in self._nodes:
+                return self._nodes[cached_hash]
+        # Use the children's expressions already in the graph
+        new_expr = with_children(
+            expr, [(index, child.expression) for index, child in children]
         )
-        hash_ = Hash(
-            str(
-                hash(
-                    (
-                        expr.function
-                        if isinstance(expr, Expression)
-                        else hash_value(expr),
-                        children,
-                    )
-                )
-            )
+        hash_ = (
+            cached_hash if new_expr is expr else compute_hash(new_expr, child_hashes)
         )
-        # If we are replacing a hash with a new expression and this is the hash of current expression, use the new one instead
-        # This means we have added a bunch of nodes we dont need possibly, so we can delete those at the end
-        if replace and hash_ == replace[0]:
-            return self.fully_add_expression(replace[1], None, *parent_ids)
-        try:
-            self.lookup(hash_)
-        except ValueError:
-            v = self.add_vertex(expression=expr, name=hash_)
-
-            for index, child_hash in children:
-                assert isinstance(expr, Expression)
-                child_v = self.lookup(child_hash)
-                self.add_edge(v, child_v, index=index)
-                if isinstance(index, int):
-                    expr.args[index] = child_v["expression"]
-                else:
-                    expr.kwargs[index] = child_v["expression"]
-        return Hash(hash_)
-
-    def lookup(self, hash_: Hash) -> igraph.Vertex:
-        return self.vs.find(name=hash_)
+        node = Node(hash_, new_expr, self._n_added)
+        self._n_added += 1
+        self._nodes[hash_] = node
+        self._ordered[node] = None
+        for index, child in children:
+            node.children[index] = child
+            child.parents[node] = child.parents.get(node, 0) + 1
+        return node
+
+    def lookup(self, hash_: Hash) -> Node:
+        return self._nodes[hash_]
 
     def replace_root(self, expr: object):
-        self.delete_vertices(self.vs)
-        self.fully_add_expression(expr, None)
-        self.assert_integrity()
-
-    def replace_child(self, expr: object, prev_index: int) -> None:
-        # Compute previous hash on the fly instead of passing it in b/c even though previous index
-        # must stay constant, the previous hash could have changed between we created this sub-graph
-        # and after the rule when we are replacing the expression
-        root_expression = self.root_vertex["expression"]
-
-        prev_expr = self.vs[prev_index]["expression"]
-        # clear graph
-        self.delete_vertices(self.vs)
-        prev_hash = self.fully_add_expression(prev_expr, None)
-
-        self.delete_vertices(self.vs)
-        new_hash = self.fully_add_expression(root_expression, (prev_hash, expr))
-        # Remove all vertice not children of new root node
-        self.delete_vertices(
-            set(self.vs.indices) - set(self.subcomponent(new_hash, igraph.OUT))
-        )
-        self.assert_integrity()
+        prev = self.root
+        self.root = self.fully_add_expression(expr)
+        self.remove_unreachable([prev])
+        self.verify()
+
+    def replace_child(self, expr: object, prev: Node) -> None:
+        """
+        Replaces the expression at `prev` with `expr`.
+
+        Only the nodes for the new expression are added and only the ancestors of
+        the replaced node are re-hashed and re-linked, so the cost is proportional
+        to the changed region instead of to the whole graph.
+        """
+        ancestors = self.ancestors(prev)
+        # Take the ancestors out of the hash index while the new expression is added,
+        # since their hashes are about to change and the new expression could contain
+        # a copy of one of them.
+        ancestor_hashes = [node.hash for node in ancestors]
+        for node in ancestors:
+            del self._nodes[typing.cast(Hash, node.hash)]
+            node.hash = None
+
+        new = self.fully_add_expression(expr)
+        if new is prev:
+            for node, hash_ in zip(ancestors, ancestor_hashes):
+                node.hash = hash_
+                self._nodes[typing.cast(Hash, hash_)] = node
+            return
+
+        # Mapping of nodes that have changed, to the node which should now be used in their place.
+        replaced: typing.Dict[Node, Node] = {prev: new}
+        garbage: typing.List[Node] = [prev]
+
+        for node in ancestors:
+            children = [
+                (index, replaced.get(child, child))
+                for index, child in node.children.items()
+            ]
+            # Create a new expression for the ancestor, instead of changing it in place,
+            # since it could be shared with other expressions
+            expr = with_children(
+                node.expression,
+                [(index, child.expression) for index, child in children],
+            )
+            hash_ = compute_hash(
+                expr,
+                [(index, typing.cast(Hash, child.hash)) for index, child in children],
+            )
+            if hash_ in self._nodes:
+                # This ancestor is now the same as a node we already have, so use that one instead
+                replaced[node] = self._nodes[hash_]
+                garbage.append(node)
+                continue
+            node.hash = hash_
+            node.expression = expr
+            self._nodes[hash_] = node
+            for index, child in children:
+                prev_child = node.children[index]
+                if child is prev_child:
+                    continue
+                node.children[index] = child
+                self._remove_parent(prev_child, node)
+                child.parents[node] = child.parents.get(node, 0) + 1
+
+        self.root = replaced.get(self.root, self.root)
+        self.remove_unreachable(garbage)
+        self.verify()
+
+    @staticmethod
+    def _remove_parent(node: Node, parent: Node) -> None:
+        n = node.parents[parent] - 1
+        if n:
+            node.parents[parent] = n
+        else:
+            del node.parents[parent]
+
+    def ancestors(self, node: Node) -> typing.List[Node]:
+        """
+        Returns all the ancestors of a node, ordered so that every node comes after
+        its children.
+        """
+        # Reverse post order of a depth first search through the parents
+        postorder: typing.List[Node] = []
+        visited = {node}
+        stack = [(node, iter(node.parents))]
+        while stack:
+            current, parents = stack[-1]
+            for parent in parents:
+                if parent not in visited:
+                    visited.add(parent)
+                    stack.append((parent, iter(parent.parents)))
+                    break
+            else:
+                stack.pop()
+                postorder.append(current)
+        # The node itself is last in the post order, so skip it
+        return postorder[-2::-1]
+
+    def remove_unreachable(self, candidates: typing.Iterable[Node]) -> None:
+        """
+        Removes all nodes in the candidates, and their descendents, which are no longer
+        reachable from the root.
+        """
+        dead: typing.Set[Node] = set()
+        stack = list(candidates)
+        while stack:
+            node = stack.pop()
+            if node in dead or node is self.root:
+                continue
+            if all(parent in dead for parent in node.parents):
+                dead.add(node)
+                stack.extend(node.children.values())
+        for node in dead:
+            del self._ordered[node]
+            # Ancestors that were merged into another node are already out of the hash index
+            if node.hash is not None:
+                del self._nodes[node.hash]
+            for child in node.children.values():
+                if child not in dead:
+                    self._remove_parent(child, node)
+
+    def topological_sort(self) -> typing.List[Node]:
+        """
+        Returns all the nodes, with every node after its children.
+
+        The leaves come first, in the order they were added, and then each node comes as soon
+        as all its children have.
+        """
+        n_children = {node: len(node.children) for node in self._ordered}
+        queue = collections.deque(node for node, n in n_children.items() if not n)
+        res: typing.List[Node] = []
+        while queue:
+            node = queue.popleft()
+            res.append(node)
+            for parent in sorted(node.parents, key=lambda parent: parent.order):
+                n = n_children[parent] - node.parents[parent]
+                n_children[parent] = n
+                if not n:
+                    queue.append(parent)
+        return res
+
+    def subcomponent(self, node: Node) -> typing.List[Node]:
+        """
+        Returns the node and all of its descendents, breadth first.
+        """
+        res = [node]
+        visited = {node}
+        for current in res:
+            for child in sorted(
+                current.children.values(), key=lambda child: child.order
+            ):
+                if child not in visited:
+                    visited.add(child)
+                    res.append(child)
+        return res
+
+    def verify(self) -> None:
+        """
+        Checks the integrity of the graph after a change, depending on the verification level.
+        """
+        if self.verification == "off":
+            return
+        self._n_changes += 1
+        if self.verification == "full" or self._n_changes % SAMPLE_INTERVAL == 1:
+            self.assert_integrity()
 
     def assert_integrity(self):
-        assert self.is_dag()
+        # Verify that there are no cycles
+        assert len(self.topological_sort()) == len(self._ordered)
         # Verify that this is one connected graph (not multiple roots)
-        assert self.is_connected(igraph.WEAK)
-
-        # Assert hashes and ids are unique
-        hashes = self.vs["name"]
-        assert len(hashes) == len(set(hashes))
-        # assert edges are unique, with respect to source
-        edges = [(e.source, e["index"]) for e in self.es]
-        assert len(edges) == len(set(edges))
-
-        for v in self.vs:
-            expr = v["expression"]
-            for e in v.out_edges():
-                idx = e["index"]
+        assert not self.root.parents
+        assert set(self.subcomponent(self.root)) == set(self._ordered)
+
+        # Assert hashes are unique and indexed
+        assert self._nodes == {node.hash: node for node in self._ordered}
+        assert len(self._nodes) == len(self._ordered)
+
+        # Assert the parents match the children, and the expressions
+        n_edges = 0
+        for node in self._ordered:
+            expr = node.expression
+            for child, n in collections.Counter(node.children.values()).items():
+                assert child in self._ordered
+                assert child.parents[node] == n
+            for idx, child in node.children.items():
                 child_expr = (
-                    expr.args[idx] if isinstance(idx, int) else expr.kwargs[idx]
+                    expr.args[idx] if isinstance(idx, int) else expr.kwargs[idx]  # type: ignore
                 )
-                assert id(child_expr) == id(e.target_vertex["expression"])
-
-    @property
-    def root_vertex(self) -> igraph.Vertex:
-        return self.vs.select(_indegree_eq=0)[0]
+                assert id(child_expr) == id(child.expression)
+            n_edges += len(node.children) - sum(node.parents.values())
+        assert n_edges == 0
 
 
 @dataclasses.dataclass
@@ -167,21 +380,29 @@ class ExpressionReference:
     """
 
     _graph: Graph
-    # Top level vertex if the top level is not root, else None
-    _optional_index: typing.Optional[int]
+    # Top level node if the top level is not root, else None
+    _optional_node: typing.Optional[Node]
 
     @classmethod
-    def from_expression(cls, expr: object) -> ExpressionReference:
+    def from_expression(
+        cls, expr: object, verification: typing.Optional[Verification] = None
+    ) -> ExpressionReference:
         """
-        Create a new reference from an expression
+        Create a new reference from an expression, checking the integrity of its graph
+        at the `verification` level.
         """
-        graph = Graph(expr)
-        # top level expression will be first added vertex
-        return cls(graph, None)
+        return cls(Graph(expr, verification), None)
 
     @property
     def _is_root(self):
-        return self._optional_index is None
+        return self._optional_node is None
+
+    @property
+    def root(self) -> ExpressionReference:
+        """
+        Returns a reference to the top level expression of the graph this is in.
+        """
+        return ExpressionReference(self._graph, None)
 
     def replace(self, new_expression: object) -> None:
         """
@@ -192,33 +413,29 @@ class ExpressionReference:
             self._graph.replace_root(new_expression)
         else:
             self._graph.replace_child(
-                new_expression, typing.cast(int, self._optional_index)
+                new_expression, typing.cast(Node, self._optional_node)
             )
-            # Reset index after replacing b/c we don't know index of newly replaced child
+            # Reset node after replacing b/c we don't know the node of newly replaced child
             # (we could, but not sure we need it since we only replace once then through this object anaway)
-            self._optional_index = None
+            self._optional_node = None
 
     @property
-    def _index(self) -> int:
-        return self._graph.root_vertex.index if self._is_root else self._optional_index
-
-    @property
-    def _vertex(self) -> igraph.Vertex:
-        return self._graph.vs[self._index]
+    def _node(self) -> Node:
+        return self._graph.root if self._optional_node is None else self._optional_node
 
     @property
     def hash(self) -> Hash:
         """
         Returns the Hash of the top level expression
         """
-        return Hash(self._vertex["name"])
+        return typing.cast(Hash, self._node.hash)
 
     @property
     def expression(self) -> object:
         """
         Returns the expression this references
         """
-        return self._vertex["expression"]
+        return self._node.expression
 
     @property
     def children(self) -> Children:
@@ -227,13 +444,11 @@ class ExpressionReference:
         """
         args = {}
         kwargs = {}
-        for e in self._graph.es[self._graph.incident(self.hash, igraph.OUT)]:
-            index = e["index"]
-            target_hash = e.target_vertex["name"]
+        for index, child in self._node.children.items():
             if isinstance(index, int):
-                args[index] = target_hash
+                args[index] = typing.cast(Hash, child.hash)
             else:
-                kwargs[index] = target_hash
+                kwargs[index] = typing.cast(Hash, child.hash)
         return Children(
             kwargs=kwargs,
             args=tuple(
@@ -251,11 +466,11 @@ class ExpressionReference:
         """
         # If we are the root node return all topological with root nodes last
         if self._is_root:
-            indices = self._graph.topological_sorting(igraph.IN)
+            nodes = self._graph.topological_sort()
         # Otherwise return all subcomponents
         else:
-            indices = self._graph.subcomponent(self._optional_index, igraph.OUT)
-        return [ExpressionReference(self._graph, i) for i in indices]
+            nodes = self._graph.subcomponent(typing.cast(Node, self._optional_node))
+        return [ExpressionReference(self._graph, node) for node in nodes]
 
 
 @dataclasses.dataclass(frozen=True)
@@ -269,18 +484,44 @@ class Children:
         return itertools.chain(enumerate(self.args), self.kwargs.items())
 
 
-@functools.singledispatch
-def hash_value(value: object) -> int:
+def compute_hash(
+    expr: object, children: typing.Iterable[typing.Tuple[typing.Union[int, str], Hash]]
+) -> Hash:
+    """
+    Computes the hash of an expression, given the hashes of its children, and caches it on the expression.
     """
-    Computes some hash for a value that should be stable. Either use the built in hash, or if we cannot
-    (like the object is mutable) then use the id.
+    if isinstance(expr, Expression):
+        return Hash(expression_digest(expr, children))
+    return Hash(digest_value(expr))
 
-    It's a single dispatch function so that you can register custom hashes for objects you don't control.
+
+def with_children(
+    expr: object, children: typing.Iterable[typing.Tuple[Index, object]]
+) -> object:
     """
-    try:
-        return hash((type(value), value))
-    except TypeError:
-        return hash((type(value), id(value)))
+    Returns the expression with the children at these indices set, creating a new expression if
+    any of them are not already the same objects.
+
+    Expressions are never changed in place, since they can be shared by other expressions.
+    """
+    if not isinstance(expr, Expression):
+        return expr
+    args, kwargs = expr.args, expr.kwargs
+    changed = [
+        (index, child)
+        for index, child in children
+        if (args[index] if isinstance(index, int) else kwargs[index]) is not child
+    ]
+    if not changed:
+        return expr
+    new_expr = copy_expression(expr)
+    for index, child in changed:
+        if isinstance(index, int):
+            new_expr.args[index] = child
+        else:
+            # Expressions with kwargs are copied with them in a new dict
+            typing.cast(typing.Dict[str, object], new_expr.kwargs)[index] = child
+    return new_expr
 
 
 def expression_children(
@@ -5,6 +5,7 @@ import typing
 
 from .expressions import *
 from .normalized import *
+from .normalized import Graph
 from .expressions_test import TEST_EXPRESSIONS
 
 
@@ -105,3 +106,63 @@ def test_doesnt_remember_replacements():
     ref.replace(a(b(c())))
 
     assert ref.expression == a(b(c()))
+
+
+def test_replace_shared_child():
+    """
+    Replacing a child that is shared between parents should update all of them.
+    """
+    ref = ExpressionReference.from_expression(e(b(c()), f(b(c()))))
+    (child_ref,) = [
+        child for child in ref.descendents if child.expression == b(c())
+    ]
+    child_ref.replace(d())
+
+    assert ref.expression == e(d(), f(d()))
+    assert len(ref._graph) == 3
+
+
+def test_replace_child_merges_ancestors():
+    """
+    If an ancestor becomes equal to an existing node after a replacement, they should be merged.
+    """
+    ref = ExpressionReference.from_expression(e(f(c()), f(d())))
+    (child_ref,) = [child for child in ref.descendents if child.expression == c()]
+    child_ref.replace(d())
+
+    assert ref.expression == e(f(d()), f(d()))
+    assert len(ref._graph) == 3
+
+
+def test_replace_child_with_copy_of_parent():
+    """
+    The new expression can contain a copy of one of the ancestors of the replaced node.
+    """
+    ref = ExpressionReference.from_expression(f(g(c())))
+    (child_ref,) = [child for child in ref.descendents if child.expression == g(c())]
+    child_ref.replace(g(f(g(c()))))
+
+    assert ref.expression == f(g(f(g(c()))))
+
+
+@pytest.mark.parametrize(
+    "verification,n_checks", [("off", 0), ("sampled", 1), ("full", 3), (None, 3)]
+)
+def test_verification(verification, n_checks, monkeypatch):
+    checks = []
+    monkeypatch.setattr(
+        Graph, "assert_integrity", lambda self: checks.append(self)
+    )
+    ref = ExpressionReference.from_expression(a(b(c())), verification)
+    ref.replace(a(d()))
+    ref.replace(b(d()))
+    assert len(checks) == n_checks
+
+
+def test_to_igraph():
+    pytest.importorskip("igraph")
+    ref = ExpressionReference.from_expression(e(b(c()), f(b(c()))))
+    graph = ref._graph.to_igraph()
+    assert graph.vcount() == 4
+    assert sorted(graph.es["index"]) == [0, 0, 0, 1]
+    assert graph.is_dag()
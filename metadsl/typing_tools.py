@@ -5,6 +5,7 @@ import copy
 import dataclasses
 import functools
 import inspect
+import itertools
 import logging
 import types
 import typing
@@ -12,6 +13,7 @@ import typing
 import typing_inspect
 
 from .dict_tools import *
+from .logging import tracing
 
 __all__ = [
     "get_type",
@@ -25,6 +27,7 @@ __all__ = [
     "match_values",
     "BoundInfer",
     "TypeVarScope",
+    "NewTypeVarScope",
     "infer_return_type",
     "ExpandedType",
     "replace_fn_typevars",
@@ -66,7 +69,7 @@ class GenericCheck(metaclass=GenericCheckType):
     Subclass this to support isinstance and issubclass checks with generic classes.
     """
 
-    pass
+    __slots__ = ()
 
 
 class OfType(GenericCheck, typing.Generic[T]):
@@ -74,7 +77,7 @@ class OfType(GenericCheck, typing.Generic[T]):
     OfType[T] should be considered a subclass of T even though it is not.
     """
 
-    pass
+    __slots__ = ()
 
 
 class ExpandedType(GenericCheck, typing.Generic[T]):
@@ -83,7 +86,7 @@ class ExpandedType(GenericCheck, typing.Generic[T]):
     so that `fn(ExpandedType[int]())` will be thought of as `fn(*xs)` where xs is an iterable of `int`.
     """
 
-    pass
+    __slots__ = ()
 
 
 original_generic_getattr = typing._GenericAlias.__getattr__  # type: ignore
@@ -342,19 +345,76 @@ TypeVarMapping = typing.Mapping[typing.TypeVar, typing.Type]  # type: ignore
 
 
 def match_values(hint_value: T, value: T) -> TypeVarMapping:
-    logger.debug("match_values hint_value=%s value=%s", hint_value, value)
+    if tracing.enabled:
+        logger.debug("match_values hint_value=%s value=%s", hint_value, value)
     hint_type = get_type(hint_value)
-    logger.debug("hint_type=%s", hint_type)
+    if tracing.enabled:
+        logger.debug("hint_type=%s", hint_type)
     return match_type(hint_type, value)
 
 
 def match_type(hint: typing.Type[T], value: T) -> TypeVarMapping:
-    logger.debug("match_type hint=%s value=%s", hint, value)
+    if tracing.enabled:
+        logger.debug("match_type hint=%s value=%s", hint, value)
+    return match_types(*hint_and_type(hint, value))
 
+
+def hint_and_type(
+    hint: typing.Type[T], value: T
+) -> typing.Tuple[typing.Type, typing.Type]:
+    """
+    Returns the hint and the type to match against it for the value. If the hint is a `Type[...]`,
+    then the value is a type itself, so match it against the inner hint.
+    """
+    hint, is_type = split_type_hint(hint)
+    if is_type:
+        return hint, typing.cast(typing.Type, value)
+    return hint, get_type(value)
+
+
+def split_type_hint(hint: typing.Type) -> typing.Tuple[typing.Type, bool]:
+    """
+    Returns the inner hint and True if the hint is a `Type[...]`, otherwise the hint and False.
+    """
     if typing_inspect.get_origin(hint) == type:
         (inner_hint,) = typing_inspect.get_args(hint)
-        return match_types(inner_hint, typing.cast(typing.Type, value))
-    return match_types(hint, get_type(value))
+        return inner_hint, True
+    return hint, False
+
+
+TYPE_CACHE_SIZE = 4096
+
+
+def type_cache(fn: typing.Callable[..., T]) -> typing.Callable[..., T]:
+    """
+    Caches the results of a function of types, like `functools.lru_cache`, but it also caches any `TypeError`
+    the function raises, since that is how we signal that types don't match.
+
+    If the arguments are not hashable, like for some generic aliases, then the function is called
+    without caching.
+    """
+
+    @functools.lru_cache(maxsize=TYPE_CACHE_SIZE)
+    def cached(*args):
+        try:
+            return fn(*args), None
+        except TypeError as e:
+            return None, e.args
+
+    @functools.wraps(fn)
+    def wrapper(*args):
+        try:
+            res, error = cached(*args)
+        except TypeError:
+            # Any type errors in the function are caught, so this means the args were unhashable
+            return fn(*args)
+        if error is not None:
+            raise TypeError(*error)
+        return res
+
+    wrapper.cache_info = cached.cache_info  # type: ignore
+    wrapper.cache_clear = cached.cache_clear  # type: ignore
+    return wrapper
 
 
 def merge_typevars(*typevars: TypeVarMapping) -> TypeVarMapping:
@@ -427,8 +487,17 @@ def get_all_typevars(t: typing.Type) -> typing.Iterable[typing.TypeVar]:  # type
 def match_types(hint: typing.Type, t: typing.Type) -> TypeVarMapping:
     """
     Matches a type hint with a type, return a mapping of any type vars to their values.
+
+    The results are cached, since the same pairs of types are matched over and over.
     """
-    logger.debug("match_types hint=%s type=%s", hint, t)
+    # Copy the mapping so callers can't change the cached one
+    return dict(_match_types(hint, t))
+
+
+@type_cache
+def _match_types(hint: typing.Type, t: typing.Type) -> TypeVarMapping:
+    if tracing.enabled:
+        logger.debug("match_types hint=%s type=%s", hint, t)
     if hint == object:
         hint = typing.Any  # type: ignore
     if t == object:
@@ -486,9 +555,11 @@ def match_types(hint: typing.Type, t: typing.Type) -> TypeVarMapping:
         else:
             raise TypeError(f"Cannot match concrete type {t} with hint {hint}")
 
-    logger.debug("checking if type subclass hint hint=%s type=%s", hint, t)
+    if tracing.enabled:
+        logger.debug("checking if type subclass hint hint=%s type=%s", hint, t)
     if not issubclass(t, hint):
-        logger.debug("not subclass")
+        if tracing.enabled:
+            logger.debug("not subclass")
         raise TypeError(f"Cannot match concrete type {t} with hint {hint}")
     return merge_typevars(
         *(
@@ -567,9 +638,209 @@ def infer_return_type(
     typing.Type[T],
     TypeVarMapping,
 ]:
-    logger.debug(
-        "infer_return_type fn=%s owner=%s args=%s kwargs=%s", fn, owner, args, kwargs
-    )
+    if tracing.enabled:
+        logger.debug(
+            "infer_return_type fn=%s owner=%s args=%s kwargs=%s",
+            fn,
+            owner,
+            args,
+            kwargs,
+        )
+    plan = call_plan(fn, owner, is_classmethod)
+    # If we called this as a class method, add the owner to the args
+    if owner and is_classmethod:
+        args = (owner,) + args  # type: ignore
+
+    if not kwargs and plan.can_bind(args):
+        final_args, hints_and_types = plan.bind(args)
+        final_kwargs: typing.Mapping[str, object] = {}
+    else:
+        final_args, final_kwargs, hints_and_types = plan.bind_signature(args, kwargs)
+
+    matches: typing.Dict[typing.TypeVar, typing.Type]
+    if plan.monomorphic:
+        # Without any typevars, we only have to check that the args match their hints
+        for hint, type_ in hints_and_types:
+            match_types(hint, type_)
+        return_type, matches = plan.return_hint, {}
+    else:
+        # Only the types of the arguments matter for the return type, so we can cache on them.
+        # Drop repeated pairs, like from variable args of the same type, since merging the same
+        # mapping again doesn't change it, and so the cache keys stay small.
+        return_type, inferred = infer_return_type_from_types(
+            fn,
+            owner,
+            is_classmethod,
+            tuple(pair for pair, _ in itertools.groupby(hints_and_types)),
+        )
+        matches = dict(inferred)
+    if is_classmethod:
+        final_args = final_args[1:]
+    if tracing.enabled:
+        logger.debug(
+            "infer_return_type matches=%s args=%s kwargs=%s", matches, args, kwargs
+        )
+    for arg in final_args:
+        record_scoped_typevars(arg, *matches.keys())
+    for kwarg in final_kwargs.values():
+        record_scoped_typevars(kwarg, *matches.keys())
+    return (final_args, final_kwargs, return_type, matches)
+
+
+HintsAndTypes = typing.List[typing.Tuple[typing.Type, typing.Type]]
+
+
+@dataclasses.dataclass(frozen=True)
+class CallPlan:
+    """
+    What we need to infer the return types of calls to a function, which is computed once
+    for each function and owner.
+
+    Calls with only positional args, to functions without keyword only args or variable keyword args,
+    are bound directly instead of through the signature.
+    """
+
+    signature: inspect.Signature
+    hints: typing.Dict[str, typing.Type]
+    # The hints for each positional parameter, or None if they cannot be bound directly
+    positional_hints: typing.Optional[typing.Tuple[typing.Type, ...]]
+    # The defaults of the last positional parameters
+    defaults: typing.Tuple[object, ...]
+    # The hint of the variable args, or None if there are none
+    variable_hint: typing.Optional[typing.Type]
+    # Whether there are no typevars in the hints or from the owner, so the return type is fixed
+    monomorphic: bool
+    return_hint: typing.Type
+
+    @classmethod
+    def create(
+        cls,
+        fn: typing.Callable,
+        owner: typing.Optional[typing.Type],
+        is_classmethod: bool,
+    ) -> CallPlan:
+        hints, owner_mappings = owner_hints(fn, owner, is_classmethod)
+        signature = inspect_signature(fn)
+
+        positional_hints: typing.Optional[typing.List[typing.Type]] = []
+        defaults: typing.List[object] = []
+        variable_hint: typing.Optional[typing.Type] = None
+        for name, p in signature.parameters.items():
+            hint = hints.get(name, typing.cast(typing.Type, typing.Any))
+            if p.kind == inspect.Parameter.VAR_POSITIONAL:
+                variable_hint = hint
+            elif p.kind in (
+                inspect.Parameter.POSITIONAL_ONLY,
+                inspect.Parameter.POSITIONAL_OR_KEYWORD,
+            ):
+                positional_hints.append(hint)  # type: ignore
+                if p.default is not inspect.Parameter.empty:
+                    defaults.append(p.default)
+            else:
+                positional_hints = None
+                break
+
+        return cls(
+            signature=signature,
+            hints=hints,
+            positional_hints=None
+            if positional_hints is None
+            else tuple(positional_hints),
+            defaults=tuple(defaults),
+            variable_hint=variable_hint,
+            monomorphic=not any(owner_mappings)
+            and not any(map(has_typevars, hints.values())),
+            return_hint=hints.get("return", typing.cast(typing.Type, typing.Any)),
+        )
+
+    def can_bind(self, args: typing.Tuple[object, ...]) -> bool:
+        """
+        Returns whether these positional args can be bound directly.
+        """
+        if self.positional_hints is None:
+            return False
+        n_positional = len(self.positional_hints)
+        if len(args) < n_positional - len(self.defaults):
+            return False
+        return len(args) <= n_positional or self.variable_hint is not None
+
+    def bind(
+        self, args: typing.Tuple[object, ...]
+    ) -> typing.Tuple[typing.Tuple[object, ...], HintsAndTypes]:
+        """
+        Binds positional args, filling in any defaults, returning all the args and the hints
+        and types to match for them.
+        """
+        positional_hints = typing.cast(
+            typing.Tuple[typing.Type, ...], self.positional_hints
+        )
+        n_missing = len(positional_hints) - len(args)
+        if n_missing > 0:
+            args = args + self.defaults[len(self.defaults) - n_missing :]
+        hints_and_types = [
+            hint_and_type(hint, arg) for hint, arg in zip(positional_hints, args)
+        ]
+        variable_args = args[len(positional_hints) :]
+        if variable_args:
+            # Only check the variable hint once, since there can be many variable args
+            hint, is_type = split_type_hint(self.variable_hint)  # type: ignore
+            hints_and_types += [
+                (hint, arg if is_type else get_type(arg))  # type: ignore
+                for arg in variable_args
+            ]
+        return args, hints_and_types
+
+    def bind_signature(
+        self, args: typing.Tuple[object, ...], kwargs: typing.Mapping[str, object]
+    ) -> typing.Tuple[
+        typing.Tuple[object, ...], typing.Mapping[str, object], HintsAndTypes
+    ]:
+        """
+        Binds the args and kwargs with the signature, returning the args, kwargs, and the hints
+        and types to match for them.
+        """
+        signature = self.signature
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+
+        # We need to edit the arguments to pop off the variable one
+        arguments = copy.copy(bound.arguments)
+
+        for arg_name, p in signature.parameters.items():
+            if p.kind == inspect.Parameter.VAR_POSITIONAL:
+                variable_args = arguments.pop(arg_name)
+                argument_items = list(arguments.items())
+                argument_items += [(arg_name, a) for a in variable_args]
+                break
+        else:
+            argument_items = list(arguments.items())
+
+        hints_and_types = [
+            hint_and_type(self.hints.get(name, typing.Any), arg)  # type: ignore
+            for name, arg in argument_items
+        ]
+        return bound.args, bound.kwargs, hints_and_types
+
+
+@type_cache
+def call_plan(
+    fn: typing.Callable, owner: typing.Optional[typing.Type], is_classmethod: bool
+) -> CallPlan:
+    return CallPlan.create(fn, owner, is_classmethod)
+
+
+def has_typevars(hint: typing.Type) -> bool:
+    return typing_inspect.is_typevar(hint) or any(get_all_typevars(hint))
+
+
+@type_cache
+def owner_hints(
+    fn: typing.Callable, owner: typing.Optional[typing.Type], is_classmethod: bool
+) -> typing.Tuple[typing.Dict[str, typing.Type], typing.List[TypeVarMapping]]:
+    """
+    Returns the type hints for a function, including for its first arg if it was accessed
+    on an owner, along with the typevars set by the owner.
+    """
     hints = copy.copy(typing_get_type_hints(fn))
     signature = inspect_signature(fn)
 
@@ -581,9 +852,7 @@ def infer_return_type(
         first_arg_type: typing.Type
         owner_origin = get_origin_type(owner)
         if is_classmethod:
-            # If we called this as a class method, add the owner to
-            # the args add the inferred type to the hints.
-            args = (owner,) + args  # type: ignore
+            # If we called this as a class method, add the inferred type to the hints.
             first_arg_type = typing.Type[owner_origin]  # type: ignore
         else:
             # If the owner had type parameters set, we should use those to start computing variables
@@ -593,42 +862,28 @@ def infer_return_type(
 
         if first_arg_name not in hints:
             hints[first_arg_name] = first_arg_type  # type: ignore
+    return hints, mappings
 
-    bound = signature.bind(*args, **kwargs)
-    bound.apply_defaults()
-
-    # We need to edit the arguments to pop off the variable one
-    arguments = copy.copy(bound.arguments)
 
-    for arg_name, p in signature.parameters.items():
-        if p.kind == inspect.Parameter.VAR_POSITIONAL:
-            variable_args = arguments.pop(arg_name)
-            argument_items = list(arguments.items())
-            argument_items += [(arg_name, a) for a in variable_args]
-            break
-    else:
-        argument_items = list(arguments.items())
-
-    return_hint: typing.Type[T] = hints.pop("return", typing.Any)  # type: ignore
-
-    mappings += [
-        match_type(hints.get(name, typing.Any), arg)  # type: ignore
-        for name, arg in argument_items
-    ]
+@type_cache
+def infer_return_type_from_types(
+    fn: typing.Callable[..., T],
+    owner: typing.Optional[typing.Type],
+    is_classmethod: bool,
+    hints_and_types: typing.Tuple[typing.Tuple[typing.Type, typing.Type], ...],
+) -> typing.Tuple[typing.Type[T], TypeVarMapping]:
+    """
+    Returns the return type of the function and the typevars it was called with, given
+    the hints of each argument and the types matched against them.
+    """
+    hints, owner_mappings = owner_hints(fn, owner, is_classmethod)
+    return_hint: typing.Type[T] = hints.get("return", typing.Any)  # type: ignore
+    mappings = owner_mappings + [match_types(*pair) for pair in hints_and_types]
     try:
         matches: TypeVarMapping = merge_typevars(*mappings)
     except ValueError:
         raise TypeError(f"Couldn't merge mappings {mappings}")
-    final_args = bound.args[1:] if is_classmethod else bound.args
-    final_kwargs = bound.kwargs
-    logger.debug(
-        "infer_return_type matches=%s args=%s kwargs=%s", matches, args, kwargs
-    )
-    for arg in final_args:
-        record_scoped_typevars(arg, *matches.keys())
-    for kwarg in final_kwargs.values():
-        record_scoped_typevars(kwarg, *matches.keys())
-    return (final_args, final_kwargs, replace_typevars(matches, return_hint), matches)
+    return replace_typevars(matches, return_hint), matches
 
 
 def record_scoped_typevars(f: object, *additional_typevars: typing.TypeVar) -> None:  # type: ignore
@@ -684,13 +939,15 @@ class NewTypeVarScope:
     ] = None
 
     def __enter__(self) -> None:
-        assert not self.previous_typvars_in_scope
+        assert self.previous_typvars_in_scope is None
         self.previous_typvars_in_scope = collections.Counter(_TYPEVARS_IN_SCOPE)
         _TYPEVARS_IN_SCOPE.clear()
 
     def __exit__(self, *exc_details) -> None:
-        assert self.previous_typvars_in_scope
+        assert self.previous_typvars_in_scope is not None
+        _TYPEVARS_IN_SCOPE.clear()
         _TYPEVARS_IN_SCOPE.update(self.previous_typvars_in_scope)
+        self.previous_typvars_in_scope = None
 
 
 @dataclasses.dataclass(unsafe_hash=True)
@@ -897,7 +1154,8 @@ def replace_fn_typevars(
             ),
         )
     if isinstance(fn, types.FunctionType):
-        logger.debug("replace_fn_typevars function fn=%s typevars=%s", fn, typevars)
+        if tracing.enabled:
+            logger.debug("replace_fn_typevars function fn=%s typevars=%s", fn, typevars)
         # Create new function by replacing typevars in existing function
         return FunctionReplaceTyping.create(fn, typevars, inner_mapping)  # type: ignore
     return fn
@@ -162,6 +162,31 @@ def test_keyword_default():
     assert default_kwarg(b="df") == (default_kwarg, ("df",), {}, str)
 
 
+def test_positional_default_variable_args():
+    @i
+    def fn(a: int, b: T = "x", *rest: T) -> T:  # type: ignore
+        ...
+
+    assert fn(1) == (fn, (1, "x"), {}, str)
+    assert fn(1, 2.0, 3.0, 4.0) == (fn, (1, 2.0, 3.0, 4.0), {}, float)
+    with pytest.raises(TypeError):
+        fn()
+    with pytest.raises(TypeError):
+        fn("a")
+    with pytest.raises(TypeError):
+        fn(1, 2.0, "a")
+
+
+def test_keyword_only():
+    @i
+    def fn(a: int, *, b: T) -> T:
+        ...
+
+    assert fn(1, b="x") == (fn, (1,), {"b": "x"}, str)
+    with pytest.raises(TypeError):
+        fn(1)
+
+
 def test_tuple_for_sequence():
     @i
     def fn(xs: typing.Sequence[T]) -> T:  # type: ignore
@@ -263,3 +288,21 @@ class TestGetType:
     def test_bound_infer_classmethod(self):
 
         assert get_type(C[int].create) == typing.Callable[[int], C[int]]
+
+
+class TestMatchTypes:
+    def test_cached(self):
+        # Changing the result should not change the cached one
+        res = match_types(typing.List[T], typing.List[int])
+        typing.cast(dict, res)[T] = str
+        assert match_types(typing.List[T], typing.List[int]) == {T: int}
+
+    def test_cached_error(self):
+        for _ in range(2):
+            with pytest.raises(TypeError, match="Cannot match"):
+                match_types(int, str)
+
+    def test_unhashable(self):
+        # Literals of unhashable values can't be hashed, so shouldn't be cached
+        hint = typing.List[typing.Literal[[1]]]  # type: ignore
+        assert match_types(hint, hint) == {}
@@ -8,7 +8,10 @@ from .abstraction import *
 from .boolean import *
 from .conversion import *
 from .either import *
+from .evaluate import *
+from .folding import *
 from .function import *
+from .fusion import *
 from .integer import *
 from .maybe import *
 from .pair import *
@@ -21,7 +24,10 @@ export_from(
     "boolean",
     "conversion",
     "either",
+    "evaluate",
+    "folding",
     "function",
+    "fusion",
     "integer",
     "maybe",
     "pair",
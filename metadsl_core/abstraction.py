@@ -1,10 +1,12 @@
 from __future__ import annotations
 
 import dataclasses
+import itertools
 import typing
 
 from metadsl import *
 from metadsl_rewrite import *
+import metadsl.normalized
 import metadsl.typing_tools
 from .strategies import *
 
@@ -87,22 +89,104 @@ fix_rule = register.post(default_rule(Abstraction.fix))
 
 def _replace(body: U, var: T, arg: T) -> U:
     """
-    Replaces all instances of `var` with `arg` inside of `body`, 
+    Replaces all instances of `var` with `arg` inside of `body`,
     except for local bindings of `var` as declared in other `from_fn`s inside.
+
+    Subtrees which don't change are shared with the original body. If `var` is a
+    variable, subtrees it is not free in are skipped without looking at their children.
     """
+    if not isinstance(var, Expression):
+        return _replace_value(body, var, arg)
+    var_digest = digest(var)
+    if _is_variable(var):
+        return _replace_variable(body, var_digest, arg)
+    return _replace_expression(body, var_digest, arg)
+
+
+def _replace_value(body: U, var: T, arg: T) -> U:
     if body == var:
         return arg  # type: ignore
     if not isinstance(body, Expression):
         return body
+    return typing.cast(U, _with_children(body, lambda e: _replace_value(e, var, arg)))
+
+
+def _replace_expression(body: U, var_digest: str, arg: T) -> U:
+    if not isinstance(body, Expression):
+        return body
+    if digest(body) == var_digest:
+        return arg  # type: ignore
+    # If is a `from_fn` node with the same var bound, don't try replacing its children
+    if _is_abstraction(body) and digest(body.args[0]) == var_digest:
+        return typing.cast(U, body)
+    return typing.cast(
+        U, _with_children(body, lambda e: _replace_expression(e, var_digest, arg))
+    )
+
+
+def _replace_variable(body: U, var_digest: str, arg: T) -> U:
+    if var_digest not in _free_variables(body):
+        return body
+    # Only variables have themselves free, so this is the variable
+    if _is_variable(body):  # type: ignore
+        return arg  # type: ignore
+    return _with_children(
+        body, lambda e: _replace_variable(e, var_digest, arg)  # type: ignore
+    )
+
+
+def _with_children(expr: U, fn: typing.Callable[[object], object]) -> U:
+    return metadsl.normalized.with_children(  # type: ignore
+        expr,
+        itertools.chain(
+            ((i, fn(arg)) for i, arg in enumerate(expr.args)),  # type: ignore
+            ((k, fn(v)) for k, v in expr.kwargs.items()),  # type: ignore
+        ),
+    )
+
+
+# The functions of variables and abstractions, looked up once since getting them from
+# the class binds them each time
+_CREATE_VARIABLE = Abstraction.create_variable.fn  # type: ignore
+_CREATE = Abstraction.create.fn  # type: ignore
+
+
+def _is_variable(expr: Expression) -> bool:
+    return (
+        isinstance(expr.function, metadsl.typing_tools.BoundInfer)
+        and expr.function.fn == _CREATE_VARIABLE
+    )
+
+
+def _is_abstraction(expr: Expression) -> bool:
+    return (
+        isinstance(expr.function, metadsl.typing_tools.BoundInfer)
+        and expr.function.fn == _CREATE
+    )
+
+
+def _free_variables(expr: object) -> typing.FrozenSet[str]:
+    """
+    Returns the digests of all variables in the expression which are not bound by an
+    abstraction inside of it.
+
+    This is cached on each expression, so subtrees shared between bodies are only
+    looked at once.
+    """
+    if not isinstance(expr, Expression):
+        return frozenset()
+    return cached_annotation(expr, "free_variables", _compute_free_variables)
+
 
-    is_abstraction = (
-        isinstance(body.function, metadsl.typing_tools.BoundInfer)
-        and body.function.fn == Abstraction.create.fn  # type: ignore
+def _compute_free_variables(expr: Expression) -> typing.FrozenSet[str]:
+    if _is_variable(expr):
+        return frozenset([digest(expr)])
+    res = frozenset().union(
+        *map(_free_variables, itertools.chain(expr.args, expr.kwargs.values()))
     )
-    # If is  a `from_fn` node with the same  var bound, don't try replacing its children
-    if is_abstraction and body.args[0] == var:
-        return body  # type: ignore
-    return body._map(lambda e: _replace(e, var, arg))  # type: ignore
+    if _is_abstraction(expr):
+        return res - {digest(expr.args[0])}
+    return res
 
 
 @register_core
@@ -6,7 +6,7 @@ from metadsl import *
 from metadsl_rewrite import *
 from .strategies import *
 from .abstraction import *
-from .abstraction import Variable, from_fn_rule
+from .abstraction import Variable, _replace, from_fn_rule
 from .integer import *
 
 
@@ -107,3 +107,17 @@ class TestAbstraction:
 
         assert execute(Abstraction.unfix(add_one)(add_one)(zero)) == one
         assert execute(Abstraction.unfix(add_two)(add_one)(zero)) == two
+
+    def test_replace(self):
+        x = Abstraction[Integer, Integer].create_variable(Variable())
+        y = Abstraction[Integer, Integer].create_variable(Variable())
+        one, two = Integer.from_int(1), Integer.from_int(2)
+        unchanged = y + one
+        res = _replace(x + unchanged, x, two)
+        assert res == two + unchanged
+        assert res.args[1] is unchanged  # type: ignore
+
+        shadowed = Abstraction[Integer, Integer].create(x, x + one)
+        res = _replace(shadowed(x), x, two)
+        assert res == shadowed(two)
+        assert res.args[0] is shadowed  # type: ignore
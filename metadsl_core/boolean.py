@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import operator
 import typing
 
 from metadsl import *
@@ -11,7 +12,7 @@ from .conversion import *
 from .maybe import *
 from .strategies import *
 
-__all__ = ["Boolean"]
+__all__ = ["Boolean", "BOOLEAN_OPERATORS", "BOOLEAN_CONSTANTS"]
 
 T = typing.TypeVar("T")
 U = typing.TypeVar("U")
@@ -47,6 +48,19 @@ class Boolean(Expression):
         return Boolean.create(False)
 
 
+# The Python operators which boolean operations on literals are evaluated with, keyed by
+# the `function_key` of their function
+BOOLEAN_OPERATORS: typing.Dict[typing.Hashable, typing.Callable[[bool, bool], bool]] = {
+    function_key(Boolean.and_): operator.and_,
+    function_key(Boolean.or_): operator.or_,
+}
+
+BOOLEAN_CONSTANTS: typing.Dict[typing.Hashable, bool] = {
+    function_key(Boolean.true): True,
+    function_key(Boolean.false): False,
+}
+
+
 register_ds(default_rule(Boolean.true))
 register_ds(default_rule(Boolean.false))
 
@@ -0,0 +1,277 @@
+"""
+Evaluates expressions of the core types with Python values, instead of one rule at a
+time.
+
+Any closed expression built out of integers, booleans, pairs, maybes, eithers and
+functions can be evaluated directly, which is the same as executing all the rules that
+apply to it, but without having to update the graph or match rules after each one.
+"""
+from __future__ import annotations
+
+import dataclasses
+import typing
+
+from metadsl import *
+from metadsl_rewrite import *
+
+from .abstraction import *
+from .abstraction import _free_variables, _replace
+from .boolean import *
+from .either import *
+from .function import *
+from .integer import *
+from .maybe import *
+from .pair import *
+from .strategies import *
+
+__all__ = ["evaluate", "evaluate_literal", "StrategyEvaluate", "EVALUATION_STEPS"]
+
+T = typing.TypeVar("T")
+Handler = typing.Callable[..., object]
+
+# The most expressions that are evaluated, before leaving the rest to the rules
+EVALUATION_STEPS = 100_000
+
+
+def evaluate(expr: object, steps: int = EVALUATION_STEPS) -> object:
+    """
+    Evaluates a closed expression, returning the expression it would be replaced with by
+    the rules, or raising `NoMatch` if it can't be evaluated.
+
+    Integers and booleans are evaluated to Python values, while other values are only
+    evaluated until their outermost function is known, like `Pair.create`.
+
+    >>> one = Integer.from_int(1)
+    >>> evaluate((one + one) * Integer.from_int(3)) == Integer.from_int(6)
+    True
+    >>> two = Integer.from_int(2)
+    >>> evaluate((one < one).if_(one, Pair.create(one + one, one).left)) == two
+    True
+    """
+    if _free_variables(expr):
+        raise NoMatch
+    try:
+        value = _Evaluator(steps)(expr)
+    except (RecursionError, ArithmeticError):
+        raise NoMatch
+    if value is expr:
+        raise NoMatch
+    if isinstance(value, bool):
+        return Boolean.create(value)
+    if isinstance(value, int):
+        return Integer.from_int(value)
+    return value
+
+
+def evaluate_literal(expr: object, steps: int = EVALUATION_STEPS) -> object:
+    """
+    Evaluates a closed expression like `evaluate`, but raises `NoMatch` unless it
+    evaluates to an integer or boolean literal.
+
+    Other values can contain abstractions, which would share their variables with the
+    expression they were evaluated from, like the body of a recursive function. So if
+    the value were put back inside that expression, applying it could capture the
+    variables there.
+
+    >>> pair = Pair.create(Integer.from_int(1), Boolean.true())
+    >>> evaluate_literal(pair.right) == Boolean.create(True)
+    True
+    """
+    result = evaluate(expr, steps)
+    if head_key(result) not in LITERAL_TYPES:
+        raise NoMatch
+    return result
+
+
+@dataclasses.dataclass
+class _Evaluator:
+    """
+    Evaluates expressions lazily, only evaluating the arguments that are needed, and
+    each of them at most once.
+    """
+
+    steps: int
+    # Mapping of the ids of the expressions evaluated so far to them and their values
+    _values: typing.Dict[int, typing.Tuple[object, object]] = dataclasses.field(
+        default_factory=dict
+    )
+
+    def __call__(self, expr: object) -> object:
+        """
+        Returns the Python value of integers and booleans, or else the expression with
+        its outermost function evaluated.
+
+        Values which are not expressions are not evaluated, so that they are never
+        confused with the Python values of integers and booleans.
+        """
+        if not isinstance(expr, Expression):
+            raise NoMatch
+        try:
+            return self._values[id(expr)][1]
+        except KeyError:
+            pass
+        self.steps -= 1
+        if self.steps < 0:
+            raise NoMatch
+        handler = _HANDLERS.get(head_key(expr))
+        value = expr if handler is None else handler(self, expr, *expr.args)
+        self._values[id(expr)] = expr, value
+        return value
+
+    def value(self, expr: object, type_: typing.Type[T]) -> T:
+        value = self(expr)
+        if type(value) is not type_:
+            raise NoMatch
+        return value
+
+    def constructor(self, expr: object, *fns: typing.Callable) -> Expression:
+        """
+        Evaluates the expression, which must be created by one of the functions.
+        """
+        value = self(expr)
+        if not isinstance(value, Expression) or head_key(value) not in map(
+            function_key, fns
+        ):
+            raise NoMatch
+        return value
+
+    def apply(self, fn: object, *args: object) -> object:
+        for arg in args:
+            var, body = self.constructor(fn, Abstraction.create).args
+            fn = _replace(body, var, arg)
+        return self(fn)
+
+
+def _literal(type_: typing.Type) -> Handler:
+    def handler(evaluate: _Evaluator, expr: Expression, value: object) -> object:
+        return value if type(value) is type_ else expr
+
+    return handler
+
+
+def _constant(value: object) -> Handler:
+    def handler(evaluate: _Evaluator, expr: Expression) -> object:
+        return value
+
+    return handler
+
+
+def _integer_operator(op: typing.Callable[[int, int], object]) -> Handler:
+    def handler(evaluate: _Evaluator, expr: Expression, l: object, r: object) -> object:
+        return op(evaluate.value(l, int), evaluate.value(r, int))
+
+    return handler
+
+
+def _boolean_operator(op: typing.Callable[[bool, bool], bool]) -> Handler:
+    def handler(evaluate: _Evaluator, expr: Expression, l: object, r: object) -> object:
+        return op(evaluate.value(l, bool), evaluate.value(r, bool))
+
+    return handler
+
+
+def _if(evaluate: _Evaluator, expr: Expression, b: object, l: object, r: object):
+    return evaluate(l if evaluate.value(b, bool) else r)
+
+
+def _pair_left(evaluate: _Evaluator, expr: Expression, pair: object) -> object:
+    return evaluate(evaluate.constructor(pair, Pair.create).args[0])
+
+
+def _pair_right(evaluate: _Evaluator, expr: Expression, pair: object) -> object:
+    return evaluate(evaluate.constructor(pair, Pair.create).args[1])
+
+
+def _maybe_match(
+    evaluate: _Evaluator, expr: Expression, maybe: object, nothing: object, just: object
+) -> object:
+    value = evaluate.constructor(maybe, Maybe.nothing, Maybe.just)
+    if not value.args:
+        return evaluate(nothing)
+    return evaluate.apply(just, value.args[0])
+
+
+def _either_match(
+    evaluate: _Evaluator, expr: Expression, either: object, l: object, r: object
+) -> object:
+    value = evaluate.constructor(either, Either.left, Either.right)
+    is_left = head_key(value) == function_key(Either.left)
+    return evaluate.apply(l if is_left else r, value.args[0])
+
+
+def _call(evaluate: _Evaluator, expr: Expression, fn: object, *args: object) -> object:
+    return evaluate.apply(fn, *args)
+
+
+def _fix(evaluate: _Evaluator, expr: Expression, fn: object) -> object:
+    return evaluate.apply(fn, expr)
+
+
+def _function_call(create: typing.Callable) -> Handler:
+    def handler(
+        evaluate: _Evaluator, expr: Expression, fn: object, *args: object
+    ) -> object:
+        _, abstraction = evaluate.constructor(fn, create).args
+        if not args:
+            return evaluate(abstraction)
+        return evaluate.apply(abstraction, *args)
+
+    return handler
+
+
+_HANDLERS: typing.Dict[typing.Hashable, Handler] = {
+    **{key: _literal(type_) for key, type_ in LITERAL_TYPES.items()},
+    **{
+        key: _constant(value)
+        for key, value in [*INTEGER_CONSTANTS.items(), *BOOLEAN_CONSTANTS.items()]
+    },
+    **{key: _integer_operator(op) for key, op in INTEGER_OPERATORS.items()},
+    **{key: _boolean_operator(op) for key, op in BOOLEAN_OPERATORS.items()},
+    function_key(Boolean.if_): _if,
+    function_key(Pair.left): _pair_left,
+    function_key(Pair.right): _pair_right,
+    function_key(Maybe.match): _maybe_match,
+    function_key(Either.match): _either_match,
+    function_key(Abstraction.__call__): _call,
+    function_key(Abstraction.fix): _fix,
+    function_key(FunctionZero.__call__): _function_call(FunctionZero.create),
+    function_key(FunctionOne.__call__): _function_call(FunctionOne.create),
+    function_key(FunctionTwo.__call__): _function_call(FunctionTwo.create),
+    function_key(FunctionThree.__call__): _function_call(FunctionThree.create),
+}
+
+# Functions which create values, so evaluating them on their own does nothing
+_CONSTRUCTORS = frozenset([*LITERAL_TYPES, function_key(Abstraction.fix)])
+
+
+@dataclasses.dataclass(frozen=True)
+class StrategyEvaluate(Strategy):
+    """
+    Replaces closed expressions which evaluate to integers or booleans with their value,
+    using `evaluate_literal`.
+    """
+
+    steps: int = EVALUATION_STEPS
+
+    def __str__(self):
+        return f"{__name__}.evaluate"
+
+    def optimize(self, executor, strategy):
+        pass
+
+    def heads(self):
+        return frozenset(_HANDLERS) - _CONSTRUCTORS
+
+    def __call__(self, ref: ExpressionReference) -> typing.Iterable[Result]:
+        expr = ref.expression
+        if not isinstance(expr, Expression) or head_key(expr) in _CONSTRUCTORS:
+            return
+        try:
+            result = evaluate_literal(expr, self.steps)
+        except NoMatch:
+            return
+        ref.replace(result)
+        yield Result(str(self))
+
+
+evaluate_rule = register_ds(StrategyEvaluate())
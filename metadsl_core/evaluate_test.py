@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import pytest
+
+from metadsl import *
+from metadsl_rewrite import *
+
+from .abstraction import *
+from .abstraction import from_fn_rule
+from .boolean import *
+from .evaluate import *
+from .integer import *
+from .maybe import *
+from .pair import *
+
+zero = Integer.from_int(0)
+one = Integer.from_int(1)
+
+# Creates the abstractions from all the python functions, so they can be evaluated
+expand = StrategyRepeat(StrategyFold(from_fn_rule))
+
+
+class TestEvaluate:
+    def test_integers(self):
+        assert evaluate((one + one).eq(Integer.from_int(2))) == Boolean.create(True)
+        seven = Integer.from_int(7)
+        assert evaluate(seven // Integer.from_int(2)) == Integer.from_int(3)
+
+    def test_only_evaluates_branch_taken(self):
+        assert evaluate(Boolean.true().if_(one, Integer.infinity() + one)) == one
+        with pytest.raises(NoMatch):
+            evaluate(Boolean.false().if_(one, Integer.infinity() + one))
+
+    def test_pair(self):
+        assert evaluate(Pair.create(one, zero).right + one) == one
+
+    def test_maybe(self):
+        add_one = Abstraction[Integer, Integer].from_fn(lambda i: i + one)
+        just = execute(Maybe.just(one).match(zero, add_one), expand)
+        assert evaluate(just) == Integer.from_int(2)
+        nothing = execute(Maybe[Integer].nothing().match(zero, add_one), expand)
+        assert evaluate(nothing) == zero
+
+    def test_recursive(self):
+        @Abstraction.fix
+        @Abstraction.from_fn
+        def factorial(
+            fact_fn: Abstraction[Integer, Integer]
+        ) -> Abstraction[Integer, Integer]:
+            @Abstraction.from_fn
+            def inner(n: Integer) -> Integer:
+                return n.eq(zero).if_(one, n * fact_fn(n - one))
+
+            return inner
+
+        expr = execute(factorial(Integer.from_int(5)), expand)
+        assert evaluate(expr) == Integer.from_int(120)
+        with pytest.raises(NoMatch):
+            evaluate(expr, steps=10)
+        assert execute(factorial(Integer.from_int(5))) == Integer.from_int(120)
+
+    def test_not_evaluated(self):
+        with pytest.raises(NoMatch):
+            evaluate(one // zero)
+        with pytest.raises(NoMatch):
+            evaluate(Abstraction[Integer, Integer].from_fn(lambda i: i + one)(one))
+
+    def test_free_variables(self):
+        add_one = execute(
+            Abstraction[Integer, Integer].from_fn(lambda i: i + one), expand
+        )
+        _, body = add_one.args
+        with pytest.raises(NoMatch):
+            evaluate(body)
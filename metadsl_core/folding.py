@@ -0,0 +1,195 @@
+"""
+Constant folding of integer, boolean and vector operations over the whole graph at once.
+
+Instead of folding one node at a time, with the whole normalization running again after
+each, every node whose args are literals is folded in one pass, from the leaves up, so
+that long chains of operations collapse together.
+"""
+from __future__ import annotations
+
+import dataclasses
+import itertools
+import typing
+import weakref
+
+from metadsl import *
+from metadsl.normalized import Graph, with_children
+from metadsl_rewrite import *
+
+from .boolean import *
+from .integer import *
+from .strategies import *
+from .vec import *
+
+__all__ = ["constant_fold", "StrategyConstantFold"]
+
+T = typing.TypeVar("T")
+Fold = typing.Callable[..., object]
+
+
+def constant_fold(expr: object) -> object:
+    """
+    Returns the expression with every integer and boolean operation on literals replaced
+    by its result, sharing all the subexpressions which don't change.
+
+    >>> one = Integer.from_int(1)
+    >>> constant_fold((one + one).eq(Integer.from_int(2))) == Boolean.create(True)
+    True
+    >>> i = Integer.infinity()
+    >>> constant_fold(i + (one + one)) == i + Integer.from_int(2)
+    True
+    """
+    # Mapping of the ids of the expressions visited so far to their folded versions
+    folded: typing.Dict[int, object] = {}
+    # Depth first, so that each expression is folded after its children
+    stack: typing.List[typing.Tuple[object, bool]] = [(expr, False)]
+    while stack:
+        current, children_folded = stack.pop()
+        if id(current) in folded:
+            continue
+        if not isinstance(current, Expression):
+            folded[id(current)] = current
+            continue
+        if not children_folded:
+            stack.append((current, True))
+            stack.extend(
+                (child, False)
+                for child in itertools.chain(current.args, current.kwargs.values())
+                if id(child) not in folded
+            )
+            continue
+        new = with_children(
+            current,
+            itertools.chain(
+                ((i, folded[id(arg)]) for i, arg in enumerate(current.args)),
+                ((k, folded[id(v)]) for k, v in current.kwargs.items()),
+            ),
+        )
+        folded[id(current)] = _fold(new)
+    return folded[id(expr)]
+
+
+def _literal(expr: object, create: typing.Callable[[T], object]) -> typing.Optional[T]:
+    """
+    Returns the Python value of an expression created from it with `create`, or None.
+    """
+    key = function_key(create)
+    if not isinstance(expr, Expression) or head_key(expr) != key:
+        return None
+    value = expr.args[0]
+    return typing.cast(T, value) if type(value) is LITERAL_TYPES[key] else None
+
+
+def _fold(expr: object) -> object:
+    if not isinstance(expr, Expression):
+        return expr
+    try:
+        fold = _FOLDS[head_key(expr)]
+    except (KeyError, TypeError):
+        return expr
+    res = fold(*expr.args)
+    return expr if res is None else res
+
+
+def _integer_operator(op: typing.Callable[[int, int], typing.Union[int, bool]]) -> Fold:
+    def fold(l: object, r: object) -> object:
+        l_int = _literal(l, Integer.from_int)
+        r_int = _literal(r, Integer.from_int)
+        if l_int is None or r_int is None:
+            return None
+        try:
+            res = op(l_int, r_int)
+        except ArithmeticError:
+            return None
+        return Boolean.create(res) if isinstance(res, bool) else Integer.from_int(res)
+
+    return fold
+
+
+def _boolean_operator(op: typing.Callable[[bool, bool], bool]) -> Fold:
+    def fold(l: object, r: object) -> typing.Optional[Boolean]:
+        l_bool = _literal(l, Boolean.create)
+        r_bool = _literal(r, Boolean.create)
+        if l_bool is None or r_bool is None:
+            return None
+        return Boolean.create(op(l_bool, r_bool))
+
+    return fold
+
+
+def _fold_if(b: object, true: object, false: object) -> object:
+    b_bool = _literal(b, Boolean.create)
+    if b_bool is None:
+        return None
+    return true if b_bool else false
+
+
+def _fold_getitem(vec: object, index: object) -> object:
+    i = _literal(index, Integer.from_int)
+    if i is None or not _is_vec(vec):
+        return None
+    items = vec.args  # type: ignore
+    return items[i] if -len(items) <= i < len(items) else None
+
+
+def _fold_length(vec: object) -> typing.Optional[Integer]:
+    if not _is_vec(vec):
+        return None
+    return Integer.from_int(len(vec.args))  # type: ignore
+
+
+def _is_vec(vec: object) -> bool:
+    return head_key(vec) == function_key(Vec.create)
+
+
+_FOLDS: typing.Dict[typing.Hashable, Fold] = {
+    **{key: _integer_operator(op) for key, op in INTEGER_OPERATORS.items()},
+    **{key: _boolean_operator(op) for key, op in BOOLEAN_OPERATORS.items()},
+    function_key(Boolean.if_): _fold_if,
+    function_key(Vec.__getitem__): _fold_getitem,
+    function_key(Vec.length): _fold_length,
+}
+
+
+@dataclasses.dataclass(unsafe_hash=True)
+class StrategyConstantFold(Strategy):
+    """
+    Folds all the constants in the graph with `constant_fold`, whenever it is called on
+    an integer or boolean operation.
+
+    It always folds the whole graph, from the top level expression, so it remembers the
+    last one it folded in each graph and does nothing until it changes.
+    """
+
+    # Mapping of each graph to the hash of the last top level expression folded in it
+    _folded: weakref.WeakKeyDictionary[Graph, Hash] = dataclasses.field(
+        default_factory=weakref.WeakKeyDictionary,
+        init=False,
+        repr=False,
+        compare=False,
+        hash=False,
+    )
+
+    def __str__(self):
+        return f"{__name__}.constant_fold"
+
+    def optimize(self, executor, strategy):
+        pass
+
+    def heads(self):
+        return frozenset(_FOLDS)
+
+    def __call__(self, ref: ExpressionReference) -> typing.Iterable[Result]:
+        root = ref.root
+        if self._folded.get(ref._graph) == root.hash:
+            return
+        expr = root.expression
+        res = constant_fold(expr)
+        if res is not expr:
+            root.replace(res)
+        self._folded[ref._graph] = root.hash
+        if res is not expr:
+            yield Result(str(self))
+
+
+constant_fold_rule = register_fold(StrategyConstantFold())
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import typing
+
+from metadsl import *
+from metadsl_rewrite import *
+
+from .abstraction import *
+from .boolean import *
+from .folding import *
+from .integer import *
+from .vec import *
+
+one = Integer.from_int(1)
+two = Integer.from_int(2)
+
+
+class TestConstantFold:
+    def test_chain(self):
+        expr = one
+        for _ in range(100):
+            expr = expr + one
+        assert constant_fold(expr) == Integer.from_int(101)
+
+    def test_if(self):
+        expr = (one < two).if_(one + one, Integer.infinity())
+        assert constant_fold(expr) == two
+
+    def test_vec(self):
+        v = Vec.create(one, Integer.infinity())
+        assert constant_fold(v[one - one] + v.length) == Integer.from_int(3)
+        assert constant_fold(v[two]) == v[two]
+
+    def test_shares_unchanged(self):
+        unchanged = Integer.infinity() + one
+        expr = unchanged * (one + one)
+        res = constant_fold(expr)
+        assert res == unchanged * two
+        assert res.args[0] is unchanged  # type: ignore
+        assert constant_fold(unchanged) is unchanged
+
+    def test_not_folded(self):
+        expr = one // Integer.from_int(0)
+        assert constant_fold(expr) is expr
+
+    def test_strategy(self):
+        expr = one
+        for _ in range(100):
+            expr = expr + one
+        ref = ExpressionReference.from_expression(expr)
+        assert len(list(StrategyConstantFold()(ref))) == 1
+        assert ref.expression == Integer.from_int(101)
+
+    def test_strategy_graphs(self):
+        strategy = StrategyConstantFold()
+        first = ExpressionReference.from_expression(one + one)
+        second = ExpressionReference.from_expression(two + two)
+        assert len(list(strategy(first))) == 1
+        assert len(list(strategy(second))) == 1
+        # Each graph is only folded again once it changes
+        assert not list(strategy(first))
+        first.replace(typing.cast(Integer, first.expression) + one)
+        assert len(list(strategy(first))) == 1
+        assert first.expression == Integer.from_int(3)
+        assert second.expression == Integer.from_int(4)
+
+    def test_inside_abstraction(self):
+        res = execute(
+            Abstraction[Integer, Integer].from_fn(lambda i: i + (one + one) * two)
+        )
+        assert isinstance(res, Abstraction)
+        _, body = res.args
+        assert isinstance(body, Integer)
+        assert body.args[1] == Integer.from_int(4)
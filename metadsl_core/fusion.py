@@ -0,0 +1,115 @@
+"""
+Fusion of chains of vector operations into one function of the indices.
+
+Instead of mapping or selecting from a vector by creating a new vector each time, the
+vector is turned into a `Vec.create_fn` first, so that all the operations on it are
+composed into its function. Its items are only created once nothing else matches, and
+then all at once.
+
+Only vectors which were created with `Vec.create` are turned back into one, other
+`Vec.create_fn`s are left as they are.
+"""
+from __future__ import annotations
+
+import typing
+
+from metadsl import *
+from metadsl_rewrite import *
+
+from .abstraction import *
+from .abstraction import _replace
+from .folding import *
+from .integer import *
+from .strategies import *
+from .vec import *
+
+__all__: typing.List[str] = []
+
+T = typing.TypeVar("T")
+U = typing.TypeVar("U")
+
+
+@expression
+def _fused(vec: Vec[T]) -> Vec[T]:
+    """
+    A vector which was created with `Vec.create` and then turned into a `Vec.create_fn`,
+    so that it is turned back into a `Vec.create` at the end.
+    """
+    ...
+
+
+@register_fuse
+@rule
+def fuse(xs: typing.Sequence[T], fn: Abstraction[T, U], s: Selection, n: Integer, x: T):
+    v = Vec[T].create(*xs)
+
+    def create_fn() -> Vec[T]:
+        return Vec.create_fn(
+            Integer.from_int(len(xs)), Abstraction[Integer, T].from_fn(lambda i: v[i])
+        )
+
+    def unless_literal(n: Integer, fused: typing.Callable[[], Vec[T]]) -> Vec[T]:
+        # Taking or dropping a literal number of items is already done without looking
+        # at them
+        if head_key(n) == function_key(Integer.from_int):
+            raise NoMatch
+        return _fused(fused())
+
+    yield v.map(fn), lambda: _fused(create_fn().map(fn))
+    yield v.select(s), lambda: _fused(create_fn().select(s))
+    yield v.set(n, x), lambda: _fused(create_fn().set(n, x))
+    yield v.append(x), lambda: _fused(create_fn().append(x))
+    yield v.take(n), lambda: unless_literal(n, lambda: create_fn().take(n))
+    yield v.drop(n), lambda: unless_literal(n, lambda: create_fn().drop(n))
+
+
+@register_fuse
+@rule
+def fused_operations(
+    v: Vec[T],
+    fn: Abstraction[T, U],
+    s: Selection,
+    n: Integer,
+    x: T,
+    initial: U,
+    fold_fn: Abstraction[U, Abstraction[T, U]],
+):
+    fused = _fused(v)
+    # Operations which return vectors are fused with the vector. The results are thunks,
+    # so that the vector is not copied to replace the wildcards in them.
+    yield fused.map(fn), lambda: _fused(v.map(fn))
+    yield fused.select(s), lambda: _fused(v.select(s))
+    yield fused.set(n, x), lambda: _fused(v.set(n, x))
+    yield fused.append(x), lambda: _fused(v.append(x))
+    yield fused.take(n), lambda: _fused(v.take(n))
+    yield fused.drop(n), lambda: _fused(v.drop(n))
+    # And those which don't are done on the vector directly, without creating its items
+    yield fused[n], lambda: v[n]
+    yield fused.length, lambda: v.length
+    yield fused.fold(initial, fold_fn), lambda: v.fold(initial, fold_fn)
+
+
+# Only create the items once nothing else matches, so that all the operations on the
+# vector are fused into its function first.
+@register.post  # type: ignore
+@rule
+def materialize(n: int, var: Integer, body: T, v: Vec[T]) -> R[Vec[T]]:
+    def inner() -> Vec[T]:
+        items = [_replace(body, var, Integer.from_int(i)) for i in range(n)]
+        if not items:
+            return Vec[T].create()
+        # Fold the items together, so that they don't each hold on to the vectors they
+        # were looked up in
+        return typing.cast(Vec[T], constant_fold(Vec.create(*items)))
+
+    yield (
+        _fused(
+            Vec.create_fn(
+                Integer.from_int(n), Abstraction[Integer, T].create(var, body)
+            )
+        ),
+        inner,
+    )
+    # If its length or function are not known, leave it as a `Vec.create_fn`, and let
+    # other operations on it, which were not fused, be done on that
+    yield _fused(v), lambda: v
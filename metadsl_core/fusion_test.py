@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+from metadsl import *
+from metadsl_rewrite import *
+
+from .abstraction import *
+from .fusion import *
+from .integer import *
+from .vec import *
+
+zero = Integer.from_int(0)
+one = Integer.from_int(1)
+two = Integer.from_int(2)
+xs = Vec.create(*(Integer.from_int(i) for i in range(5)))
+double = Abstraction[Integer, Integer].from_fn(lambda i: i * two)
+inc = Abstraction[Integer, Integer].from_fn(lambda i: i + one)
+
+
+def ints(*items: int) -> Vec[Integer]:
+    return Vec.create(*map(Integer.from_int, items))
+
+
+class TestFusion:
+    def test_map(self):
+        assert execute(xs.map(double).map(inc)) == ints(1, 3, 5, 7, 9)
+
+    def test_chain(self):
+        every_other = Selection.create_slice(one, Integer.infinity(), two)
+        res = execute(xs.map(double).select(every_other).append(zero).set(zero, two))
+        assert res == ints(2, 6, 0)
+
+    def test_select(self):
+        # The stop is past the end of the vector
+        selection = Selection.create_slice(
+            Integer.from_int(3), Integer.from_int(10), one
+        )
+        assert execute(xs.select(selection)) == ints(3, 4)
+        indices = Selection.create_indices(ints(4, 0))
+        assert execute(xs.map(inc).select(indices)) == ints(5, 1)
+
+    def test_create_fn(self):
+        v = Vec.create_fn(two, Abstraction[Integer, Integer].from_fn(lambda i: i))
+        both = v + v.map(double)
+        assert execute(both.length) == Integer.from_int(4)
+        assert execute(both[Integer.from_int(3)]) == two
+        assert execute(v.take(Integer.from_int(5)).length) == two
+        assert execute(v.drop(Integer.from_int(5)).length) == zero
+
+    def test_create_fn_lazy(self):
+        """
+        Vectors which weren't created with `Vec.create` should not have their items
+        created.
+        """
+        v = Vec.create_fn(
+            Integer.from_int(20000), Abstraction[Integer, Integer].from_fn(lambda i: i)
+        )
+        res = execute(v)
+        assert isinstance(res, Vec)
+        assert head_key(res) == function_key(Vec.create_fn)
+        assert execute(v.map(inc)[two]) == Integer.from_int(3)
+
+    def test_large(self):
+        n = 1000
+        vec = Vec.create(*(Integer.from_int(i) for i in range(n)))
+        res = execute(vec.map(double).map(inc))
+        assert res == ints(*(i * 2 + 1 for i in range(n)))
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import operator
 import typing
 
 from metadsl import *
@@ -11,7 +12,13 @@ from .conversion import *
 from .maybe import *
 from .strategies import *
 
-__all__ = ["Integer"]
+__all__ = [
+    "Integer",
+    "INTEGER_OPERATORS",
+    "INTEGER_DIVISIONS",
+    "INTEGER_CONSTANTS",
+    "LITERAL_TYPES",
+]
 
 T = typing.TypeVar("T")
 
@@ -87,6 +94,45 @@ class Integer(Expression):
         ...
 
 
+# The Python operators which integer operations on literals are evaluated with, keyed by
+# the `function_key` of their function
+INTEGER_OPERATORS: typing.Dict[
+    typing.Hashable, typing.Callable[[int, int], typing.Union[int, bool]]
+] = {
+    function_key(fn): op
+    for fn, op in [
+        (Integer.__add__, operator.add),
+        (Integer.__sub__, operator.sub),
+        (Integer.__mul__, operator.mul),
+        (Integer.__floordiv__, operator.floordiv),
+        (Integer.__mod__, operator.mod),
+        (Integer.eq, operator.eq),
+        (Integer.__lt__, operator.lt),
+        (Integer.__le__, operator.le),
+        (Integer.__gt__, operator.gt),
+        (Integer.__ge__, operator.ge),
+    ]
+}
+
+# The operators which raise a `ZeroDivisionError` when dividing by zero, in which case
+# they are not evaluated
+INTEGER_DIVISIONS = frozenset(
+    map(function_key, [Integer.__floordiv__, Integer.__mod__])
+)
+
+INTEGER_CONSTANTS: typing.Dict[typing.Hashable, int] = {
+    function_key(Integer.zero): 0,
+    function_key(Integer.one): 1,
+}
+
+# The Python types of the values of integer and boolean literals, keyed by the
+# `function_key` of the function that creates them
+LITERAL_TYPES: typing.Dict[typing.Hashable, typing.Type] = {
+    function_key(Integer.from_int): int,
+    function_key(Boolean.create): bool,
+}
+
+
 register_ds(default_rule(Integer.zero))
 register_ds(default_rule(Integer.inc))
 register_ds(default_rule(Integer.one))
@@ -1,7 +1,17 @@
 from metadsl_rewrite import *
 
-__all__ = ["register_core", "register_ds", "register_convert"]
+__all__ = [
+    "register_fold",
+    "register_core",
+    "register_ds",
+    "register_convert",
+    "register_fuse",
+]
 
+# Registered first, so that constant folding runs in every phase after it
+register_fold = register["constant folding"]
 register_core = register["core"]
 register_convert = register["conversion"]
+# Before the data structures, so that operations are fused before any are executed
+register_fuse = register["fusion"]
 register_ds = register["data structures"]
@@ -10,6 +10,7 @@ from .integer import *
 from .maybe import *
 from .conversion import *
 from .abstraction import *
+from .evaluate import *
 from .pair import *
 from .strategies import *
 
@@ -193,37 +194,75 @@ def create_fn_rules(
     fn1: Abstraction[Integer, T],
     n: Integer,
     s: Selection,
+    g: Abstraction[T, U],
+    initial: U,
+    fold_fn: Abstraction[U, Abstraction[T, U]],
 ):
     v = Vec.create_fn(l, fn)
     v1 = Vec.create_fn(l1, fn1)
     one = Integer.from_int(1)
+    # The functions are created in thunks, so that their bodies use the matched values
+    # instead of the wildcards
     yield v[i], fn(i)
-    yield v.append(x), Vec.create_fn(
+    yield v.append(x), lambda: Vec.create_fn(
         l + one, Abstraction[Integer, T].from_fn(lambda i: (i < l).if_(fn(i), x))
     )
-    yield v + v1, Vec.create_fn(
+    yield v + v1, lambda: Vec.create_fn(
         l + l1,
-        Abstraction[Integer, T].from_fn(lambda i: (i < l).if_(fn(i), fn1(i - l1))),
+        Abstraction[Integer, T].from_fn(lambda i: (i < l).if_(fn(i), fn1(i - l))),
     )
     yield v.length, l
-    yield v.take(n), Vec.create_fn(l - n, fn)
-    yield v.drop(n), Vec.create_fn(
-        l - n, Abstraction[Integer, T].from_fn(lambda i: fn(i + n)),
+    # Taking or dropping more than the length is the same as taking or dropping all
+    yield v.take(n), lambda: Vec.create_fn((n < l).if_(n, l), fn)
+    yield v.drop(n), lambda: Vec.create_fn(
+        l - (n < l).if_(n, l), Abstraction[Integer, T].from_fn(lambda i: fn(i + n)),
     )
-    yield v.select(s), Vec.create_fn(
+    yield v.select(s), lambda: Vec.create_fn(
         s.length(l), Abstraction[Integer, T].from_fn(lambda i: v[s.new_to_old(i)]),
     )
-    yield v.set(n, x), Vec.create_fn(
+    yield v.set(n, x), lambda: Vec.create_fn(
         l, Abstraction[Integer, T].from_fn(lambda i: i.eq(n).if_(x, fn(i)))
     )
     # set selection maps each old index, looking up the first new one on the new v, if there
     # are any, otherwise, use old v
-    yield v.set_selection(s, v1), Vec.create_fn(
+    yield v.set_selection(s, v1), lambda: Vec.create_fn(
         l,
         Abstraction[Integer, T].from_fn(
             lambda i: s.old_to_new(i).first.match(fn(i), fn1)
         ),
     )
+    # Mapping composes the functions, so chains of maps and selections stay one
+    # function, which is only called for the items that are used
+    yield v.map(g), Vec.create_fn(l, g + fn)
+
+    def fold() -> U:
+        try:
+            length = evaluate_literal(l).args[0]  # type: ignore
+            items = (fn(Integer.from_int(i)) for i in range(length))
+            return _fold_items(initial, items, fold_fn)
+        except NoMatch:
+            return l.fold(
+                initial,
+                Abstraction[Integer, Abstraction[U, U]].from_fn(
+                    lambda i: Abstraction[U, U].from_fn(lambda acc: fold_fn(acc)(fn(i)))
+                ),
+            )
+
+    yield v.fold(initial, fold_fn), fold
+
+
+def _fold_items(
+    initial: U, items: typing.Iterable[T], fn: Abstraction[U, Abstraction[T, U]]
+) -> U:
+    """
+    Folds over the items one at a time, evaluating the value after each, so only the
+    current value and item are kept. Raises `NoMatch` unless each value is an integer
+    or boolean.
+    """
+    value = initial
+    for item in items:
+        value = typing.cast(U, evaluate_literal(fn(value)(item)))
+    return value
 
 
 @register_ds
@@ -242,7 +281,21 @@ def select_slice(start: Integer, stop: Integer, step: Integer, i: Integer):
     yield (s.new_to_old(i), start + (i * step))
     # Compute the actual stop if one is specified, by taking min of stop and old length "i"
     actual_stop = (i < stop).if_(i, stop)
-    yield (s.length(i), (stop - actual_stop) // step)
+    yield (
+        s.length(i),
+        (start < actual_stop).if_(
+            (actual_stop - start + step - Integer.from_int(1)) // step,
+            Integer.from_int(0),
+        ),
+    )
+
+
+@register_ds
+@rule
+def select_indices(indices: Vec[Integer], i: Integer):
+    s = Selection.create_indices(indices)
+    yield s.new_to_old(i), indices[i]
+    yield s.length(i), indices.length
 
 
 @register_ds  # type: ignore
@@ -398,6 +451,10 @@ def fold_vec(
     xs: typing.Sequence[T], initial: U, fn: Abstraction[U, Abstraction[T, U]]
 ) -> R[U]:
     def inner() -> U:
+        try:
+            return _fold_items(initial, xs, fn)
+        except NoMatch:
+            pass
         res = initial
         for x in xs:
             res = fn(res)(x)
@@ -70,3 +70,24 @@ class TestVec:
         assert (
             execute(Converter[Vec[Int]].convert(("hi",))) == Maybe[Vec[Int]].nothing()
         )
+
+    def test_create_fn_map(self):
+        one = Integer.from_int(1)
+        v = Vec.create_fn(
+            Integer.from_int(3), Abstraction[Integer, Integer].from_fn(lambda i: i)
+        )
+        mapped = v.map(Abstraction[Integer, Integer].from_fn(lambda i: i + one)).map(
+            Abstraction[Integer, Integer].from_fn(lambda i: i * i)
+        )
+        assert execute(mapped[Integer.from_int(2)]) == Integer.from_int(9)
+        assert execute(mapped.length) == Integer.from_int(3)
+
+    def test_create_fn_fold(self):
+        v = Vec.create_fn(
+            Integer.from_int(1000),
+            Abstraction[Integer, Integer].from_fn(lambda i: i * Integer.from_int(2)),
+        )
+        add = Abstraction[Integer, Abstraction[Integer, Integer]].from_fn(
+            lambda acc: Abstraction[Integer, Integer].from_fn(lambda x: acc + x)
+        )
+        assert execute(v.fold(Integer.from_int(0), add)) == Integer.from_int(999000)
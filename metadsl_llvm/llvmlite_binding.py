@@ -3,6 +3,7 @@ Compile LLVM module from IR.
 """
 from __future__ import annotations
 
+import functools
 import typing
 
 import llvmlite.binding as binding
@@ -15,10 +16,18 @@ from .strategies import *
 
 __all__ = ["ModuleRef", "ExecutionEngine"]
 
-binding.initialize()
-binding.initialize_native_target()
-binding.initialize_native_asmprinter()
-target_machine = binding.Target.from_default_triple().create_target_machine()
+
+@functools.lru_cache()
+def target_machine() -> binding.TargetMachine:
+    """
+    Initializes LLVM and returns the target machine for this host.
+
+    This happens the first time it is needed, instead of on import.
+    """
+    binding.initialize()
+    binding.initialize_native_target()
+    binding.initialize_native_asmprinter()
+    return binding.Target.from_default_triple().create_target_machine()
 
 
 class ModuleRef(Expression):
@@ -41,6 +50,7 @@ class ModuleRef(Expression):
 @rule
 def module_ref_create(code: str) -> R[ModuleRef]:
     def inner() -> ModuleRef:
+        target_machine()
         llmod = binding.parse_assembly(code)
         llmod.verify()
         return ModuleRef.box(llmod)
@@ -86,7 +96,7 @@ _execution_engines: typing.List[binding.ExecutionEngine] = []
 @rule
 def execution_engine_create(mod: binding.ModuleRef) -> R[ExecutionEngine]:
     def inner() -> ExecutionEngine:
-        ee = binding.create_mcjit_compiler(mod, target_machine)
+        ee = binding.create_mcjit_compiler(mod, target_machine())
         ee.finalize_object()
         _execution_engines.append(ee)
         return ExecutionEngine.box(ee)
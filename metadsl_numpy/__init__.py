@@ -52,6 +52,7 @@ from .boxing import *
 from .function_compat import *
 from .injest import *
 from .int_compat import *
+from .packed import *
 from .tuple_compat import *
 
 export_from(
@@ -62,4 +63,5 @@ export_from(
     "int_compat",
     "tuple_compat",
     "function_compat",
+    "packed",
 )
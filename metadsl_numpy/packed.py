@@ -0,0 +1,466 @@
+"""
+Vectors of integers packed into a NumPy array.
+
+`Vec.create` holds each item as its own expression, so building and rewriting a vector
+of a million integers creates millions of expressions. A `PackedVec` instead holds all
+of them in one int64 array, and the rules on it operate on the whole array at once.
+
+Arithmetic on the arrays is only done when the results are sure to fit in an int64, so
+it never wraps around. Otherwise, it falls back to Python's integers, like on the
+unpacked vector.
+"""
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import math
+import operator
+import typing
+
+import numpy
+
+from metadsl import *
+from metadsl_core import *
+from metadsl_rewrite import *
+from metadsl_core.strategies import *
+
+__all__ = ["Int64Array", "PackedVec"]
+
+U = typing.TypeVar("U")
+
+_INT64 = numpy.iinfo(numpy.int64)
+
+
+@dataclasses.dataclass(init=False, frozen=True, eq=False)
+class Int64Array:
+    """
+    A read only copy of a one dimensional array of int64s, which can be used as the
+    argument of an expression.
+
+    It is compared and hashed by a digest of its contents, which is only computed once.
+
+    >>> Int64Array([1, 2]) == Int64Array(numpy.arange(1, 3))
+    True
+    >>> Int64Array([1, 2])
+    Int64Array([1, 2])
+    """
+
+    array: numpy.ndarray
+    _digest: str = dataclasses.field(repr=False)
+
+    def __init__(self, array: typing.Union[numpy.ndarray, typing.Sequence[int]]):
+        array = numpy.array(array, dtype=numpy.int64)
+        if array.ndim != 1:
+            raise ValueError(f"Can only pack one dimensional arrays, not {array.ndim}")
+        array.setflags(write=False)
+        object.__setattr__(self, "array", array)
+        object.__setattr__(
+            self,
+            "_digest",
+            hashlib.blake2b(array.tobytes(), digest_size=16).hexdigest(),
+        )
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Int64Array) and self._digest == other._digest
+
+    def __hash__(self) -> int:
+        return hash(self._digest)
+
+    def __len__(self) -> int:
+        return len(self.array)
+
+    def __repr__(self) -> str:
+        return f"Int64Array({numpy.array2string(self.array, separator=', ')})"
+
+
+@digest_value.register
+def _digest_int64_array(value: Int64Array) -> str:
+    return digest_value(("Int64Array", value._digest))
+
+
+class PackedVec(Expression):
+    """
+    Creates vectors of integers from NumPy arrays.
+    """
+
+    @expression
+    @classmethod
+    def create(cls, array: Int64Array) -> Vec[Integer]:
+        ...
+
+
+def _is(expr: object, fn: typing.Callable) -> bool:
+    return head_key(expr) == function_key(fn)
+
+
+def _unpack(array: Int64Array) -> Vec[Integer]:
+    """
+    Returns the vector with each integer as its own expression, for the rules which
+    can't be done on the array.
+    """
+    return Vec[Integer].create(*map(Integer.from_int, array.array.tolist()))
+
+
+def _int(expr: object) -> typing.Optional[int]:
+    """
+    Returns the value of an integer literal, or None.
+    """
+    if _is(expr, Integer.from_int) and type(expr.args[0]) is int:  # type: ignore
+        return expr.args[0]  # type: ignore
+    return None
+
+
+def _fits(i: int) -> bool:
+    return int(_INT64.min) <= i <= int(_INT64.max)
+
+
+def _magnitude(value: object) -> int:
+    """
+    Returns the largest absolute value of an integer or array of integers.
+    """
+    if not isinstance(value, numpy.ndarray):
+        return abs(int(value))  # type: ignore
+    if not value.size:
+        return 0
+    # Not `numpy.abs`, since the absolute value of the smallest int64 doesn't fit
+    return max(int(value.max()), -int(value.min()))
+
+
+def _check_bound(
+    bound: typing.Callable[[int, int], int], l: object, r: object
+) -> None:
+    """
+    Raises `NoMatch` if an operation on arrays could overflow an int64, given a bound on
+    the size of its result from the sizes of its args.
+
+    Operations on Python integers never overflow, so they are not checked.
+    """
+    if not isinstance(l, numpy.ndarray) and not isinstance(r, numpy.ndarray):
+        return
+    if not _fits(bound(_magnitude(l), _magnitude(r))):
+        raise NoMatch
+
+
+def _ints(vec: object) -> typing.Optional[Int64Array]:
+    """
+    Returns the array of a packed vector, or of a vector of integer literals, or None.
+    """
+    if _is(vec, PackedVec.create):
+        return vec.args[0]  # type: ignore
+    if not _is(vec, Vec.create):
+        return None
+    values: typing.List[int] = []
+    for arg in vec.args:  # type: ignore
+        value = _int(arg)
+        if value is None:
+            return None
+        values.append(value)
+    try:
+        return Int64Array(values)
+    except OverflowError:
+        return None
+
+
+def _vectorize(expr: object, variables: typing.Mapping[Variable, object]) -> object:
+    """
+    Evaluates an integer or boolean expression, with its variables set to arrays or
+    Python values, raising `NoMatch` if it contains anything else.
+    """
+    values: typing.Dict[int, object] = {}
+
+    def inner(expr: object) -> object:
+        if id(expr) in values:
+            return values[id(expr)]
+        if not isinstance(expr, Expression):
+            raise NoMatch
+        fn = head_key(expr)
+        args = expr.args
+        if fn == function_key(Abstraction.create_variable):
+            try:
+                value = variables[args[0]]  # type: ignore
+            except KeyError:
+                raise NoMatch
+        elif fn in LITERAL_TYPES:
+            if type(args[0]) is not LITERAL_TYPES[fn]:
+                raise NoMatch
+            value = args[0]
+        elif fn in _CONSTANTS:
+            value = _CONSTANTS[fn]
+        elif fn == function_key(Integer.inc):
+            x = inner(args[0])
+            _check_bound(operator.add, x, 1)
+            value = x + 1  # type: ignore
+        elif fn == function_key(Boolean.if_):
+            b, true, false = map(inner, args)
+            value = (
+                (true if b else false)
+                if isinstance(b, bool)
+                else numpy.where(b, true, false)  # type: ignore
+            )
+        elif fn in _OPERATORS:
+            l, r = map(inner, args)
+            if fn in INTEGER_DIVISIONS and numpy.any(numpy.equal(r, 0)):  # type: ignore
+                raise NoMatch
+            if fn in _BOUNDS:
+                _check_bound(_BOUNDS[fn], l, r)
+            value = _OPERATORS[fn](l, r)
+        else:
+            raise NoMatch
+        values[id(expr)] = value
+        return value
+
+    try:
+        return inner(expr)
+    except (OverflowError, TypeError):
+        raise NoMatch
+
+
+_CONSTANTS: typing.Dict[typing.Hashable, object] = {
+    **INTEGER_CONSTANTS,
+    **BOOLEAN_CONSTANTS,
+}
+
+# The operators work on arrays as well, besides dividing by zero, which does not raise
+_OPERATORS: typing.Dict[typing.Hashable, typing.Callable[..., object]] = {
+    **INTEGER_OPERATORS,
+    **BOOLEAN_OPERATORS,
+}
+
+# The largest absolute value the result of each arithmetic operator can have, given the
+# largest absolute values of its args. The rest can't overflow.
+_BOUNDS: typing.Dict[typing.Hashable, typing.Callable[[int, int], int]] = {
+    function_key(Integer.__add__): operator.add,
+    function_key(Integer.__sub__): operator.add,
+    function_key(Integer.__mul__): operator.mul,
+    # Only the smallest int64 divided by -1 overflows, whose absolute value doesn't fit
+    function_key(Integer.__floordiv__): lambda l, r: l,
+}
+
+
+def _sum_fits(n: int, magnitude: int) -> bool:
+    return _fits(n * magnitude)
+
+
+def _product_fits(n: int, magnitude: int) -> bool:
+    return magnitude <= 1 or n * math.log2(magnitude) < 62
+
+
+# Operators which can be folded over an array by reducing it, how to combine the
+# reduced value with the initial one, and whether the reduction of n values of up to
+# some absolute value fits in an int64
+_REDUCTIONS: typing.Dict[
+    typing.Hashable,
+    typing.Tuple[
+        typing.Callable[[numpy.ndarray], object],
+        typing.Callable,
+        typing.Callable[[int, int], bool],
+    ],
+] = {
+    function_key(Integer.__add__): (numpy.sum, operator.add, _sum_fits),
+    function_key(Integer.__mul__): (numpy.prod, operator.mul, _product_fits),
+}
+
+
+def _abstraction(fn: object) -> typing.Tuple[Variable, object]:
+    """
+    Returns the variable and body of an abstraction, raising `NoMatch` if it isn't one.
+    """
+    if not _is(fn, Abstraction.create):
+        raise NoMatch
+    var, body = fn.args  # type: ignore
+    return var.args[0], body
+
+
+def _to_value(value: object) -> object:
+    """
+    Returns the expression for a value computed by `_vectorize`.
+    """
+    if isinstance(value, (bool, numpy.bool_)):
+        return Boolean.create(bool(value))
+    if isinstance(value, (int, numpy.integer)):
+        return Integer.from_int(int(value))
+    raise NoMatch
+
+
+def _map(array: Int64Array, fn: Abstraction[Integer, U]) -> Vec[U]:
+    try:
+        var, body = _abstraction(fn)
+        value = numpy.asarray(_vectorize(body, {var: array.array}))
+    except NoMatch:
+        return _unpack(array).map(fn)
+    values = numpy.broadcast_to(value, array.array.shape)
+    if values.dtype.kind == "i":
+        return typing.cast(Vec[U], PackedVec.create(Int64Array(values)))
+    if values.dtype.kind == "b":
+        return typing.cast(
+            Vec[U], Vec[Boolean].create(*map(Boolean.create, values.tolist()))
+        )
+    return _unpack(array).map(fn)
+
+
+def _fold(
+    array: Int64Array, initial: U, fn: Abstraction[U, Abstraction[Integer, U]]
+) -> U:
+    try:
+        acc_var, inner = _abstraction(fn)
+        var, body = _abstraction(inner)
+    except NoMatch:
+        return _unpack(array).fold(initial, fn)
+    # If the body adds or multiplies the accumulator with something which only depends
+    # on the item, reduce the array of those instead
+    if head_key(body) in _REDUCTIONS:
+        l, r = body.args  # type: ignore
+        for acc, item in [(l, r), (r, l)]:
+            if not _is(acc, Abstraction.create_variable) or acc.args[0] != acc_var:
+                continue
+            try:
+                value = numpy.asarray(_vectorize(item, {var: array.array}))
+            except NoMatch:
+                break
+            if value.dtype.kind != "i":
+                break
+            reduce, combine, fits = _REDUCTIONS[head_key(body)]
+            values = numpy.broadcast_to(value, array.array.shape)
+            if not fits(len(values), _magnitude(values)):
+                # Reduce them as Python integers instead, which don't overflow
+                values = values.astype(object)
+            reduced = reduce(values)
+            return combine(initial, Integer.from_int(int(reduced)))  # type: ignore
+    # Otherwise, fold over the Python values one by one
+    try:
+        res = _vectorize(initial, {})
+        for item in array.array.tolist():
+            res = _vectorize(body, {acc_var: res, var: item})
+        return typing.cast(U, _to_value(res))
+    except NoMatch:
+        return _unpack(array).fold(initial, fn)
+
+
+def _select(array: Int64Array, selection: Selection) -> Vec[Integer]:
+    if _is(selection, Selection.create_slice):
+        start, stop, step = map(_int, selection.args)  # type: ignore
+        infinite = _is(selection.args[1], Integer.infinity)  # type: ignore
+        if (
+            start is not None
+            and step is not None
+            and (stop is not None or infinite)
+            and min(start, step - 1, 0 if stop is None else stop) >= 0
+        ):
+            return PackedVec.create(Int64Array(array.array[start:stop:step]))
+    if _is(selection, Selection.create_indices):
+        indices = _ints(selection.args[0])  # type: ignore
+        if indices is not None:
+            if ((indices.array < 0) | (indices.array >= len(array))).any():
+                raise NoMatch
+            return PackedVec.create(Int64Array(array.array[indices.array]))
+    return _unpack(array).select(selection)
+
+
+def _getitem(array: Int64Array, i: int) -> Integer:
+    if not -len(array) <= i < len(array):
+        raise NoMatch
+    return Integer.from_int(int(array.array[i]))
+
+
+@register_ds  # type: ignore
+@rule
+def packed_length(array: Int64Array, i: int) -> R[Integer]:
+    v = PackedVec.create(array)
+    yield v.length, lambda: Integer.from_int(len(array))
+    yield v[Integer.from_int(i)], lambda: _getitem(array, i)
+
+
+@register_ds  # type: ignore
+@rule
+def packed_take_drop(array: Int64Array, i: int) -> R[Vec[Integer]]:
+    v = PackedVec.create(array)
+    yield (
+        v.take(Integer.from_int(i)),
+        lambda: PackedVec.create(Int64Array(array.array[:i])),
+    )
+    yield (
+        v.drop(Integer.from_int(i)),
+        lambda: PackedVec.create(Int64Array(array.array[i:])),
+    )
+
+
+@register_ds  # type: ignore
+@rule
+def packed_add(array: Int64Array, other: Vec[Integer]) -> R[Vec[Integer]]:
+    def concatenate(ls: Vec[Integer], rs: Vec[Integer]) -> Vec[Integer]:
+        l, r = _ints(ls), _ints(rs)
+        if l is not None and r is not None:
+            return PackedVec.create(Int64Array(numpy.concatenate([l.array, r.array])))
+        # If the other vector has items which aren't literals, add them unpacked
+        if not _is(other, Vec.create):
+            raise NoMatch
+        return (_unpack(l) if l is not None else ls) + (
+            _unpack(r) if r is not None else rs
+        )
+
+    v = PackedVec.create(array)
+    yield v + other, lambda: concatenate(v, other)
+    yield other + v, lambda: concatenate(other, v)
+
+
+@register_ds  # type: ignore
+@rule
+def packed_map(array: Int64Array, fn: Abstraction[Integer, U]) -> R[Vec[U]]:
+    return PackedVec.create(array).map(fn), lambda: _map(array, fn)  # type: ignore
+
+
+@register_ds  # type: ignore
+@rule
+def packed_select(array: Int64Array, s: Selection) -> R[Vec[Integer]]:
+    return PackedVec.create(array).select(s), lambda: _select(array, s)
+
+
+@register_ds  # type: ignore
+@rule
+def packed_fold(
+    array: Int64Array, initial: U, fn: Abstraction[U, Abstraction[Integer, U]]
+) -> R[U]:
+    return (
+        PackedVec.create(array).fold(initial, fn),
+        lambda: _fold(array, initial, fn),
+    )
+
+
+@register_ds  # type: ignore
+@rule
+def packed_set(
+    array: Int64Array, x: Integer, i: Integer, s: Selection, values: Vec[Integer]
+) -> R[Vec[Integer]]:
+    def append() -> Vec[Integer]:
+        x_int = _int(x)
+        if x_int is not None and _fits(x_int):
+            return PackedVec.create(Int64Array(numpy.append(array.array, x_int)))
+        return _unpack(array).append(x)
+
+    def set_() -> Vec[Integer]:
+        i_int, x_int = _int(i), _int(x)
+        if (
+            i_int is None
+            or x_int is None
+            or not _fits(x_int)
+            or not 0 <= i_int < len(array)
+        ):
+            return _unpack(array).set(i, x)
+        res = array.array.copy()
+        res[i_int] = x_int
+        return PackedVec.create(Int64Array(res))
+
+    v = PackedVec.create(array)
+    yield v.append(x), append
+    yield v.set(i, x), set_
+    # Setting a selection is left to the rules on the unpacked vector
+    yield v.set_selection(s, values), lambda: _unpack(array).set_selection(s, values)
+
+
+@register_convert  # type: ignore
+@rule
+def convert_packed(array: Int64Array) -> R[Maybe[Vec[Integer]]]:
+    return (
+        Converter[Vec[Integer]].convert(array),
+        lambda: Maybe.just(PackedVec.create(array)),
+    )
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import numpy
+
+from metadsl import *
+from metadsl_core import *
+from metadsl_rewrite import *
+
+from .packed import *
+
+zero = Integer.from_int(0)
+one = Integer.from_int(1)
+two = Integer.from_int(2)
+v = PackedVec.create(Int64Array([1, 2, 3, 4]))
+
+
+def packed(*items: int) -> Vec[Integer]:
+    return PackedVec.create(Int64Array(list(items)))
+
+
+def test_length_getitem() -> None:
+    assert execute(v.length) == Integer.from_int(4)
+    assert execute(v[two]) == Integer.from_int(3)
+
+
+def test_take_drop() -> None:
+    assert execute(v.take(two)) == packed(1, 2)
+    assert execute(v.drop(two)) == packed(3, 4)
+
+
+def test_add() -> None:
+    assert execute(v + v.take(one)) == packed(1, 2, 3, 4, 1)
+    assert execute(Vec.create(zero) + v) == packed(0, 1, 2, 3, 4)
+    i = Integer.infinity()
+    assert execute(v.take(one) + Vec.create(i)) == Vec[Integer].create(one, i)
+
+
+def test_map() -> None:
+    square = Abstraction[Integer, Integer].from_fn(lambda i: i * i + one)
+    assert execute(v.map(square)) == packed(2, 5, 10, 17)
+    is_big = Abstraction[Integer, Boolean].from_fn(lambda i: i > two)
+    assert execute(v.take(Integer.from_int(3)).map(is_big)) == Vec[Boolean].create(
+        Boolean.create(False), Boolean.create(False), Boolean.create(True)
+    )
+    just = Abstraction[Integer, Maybe[Integer]].from_fn(lambda i: Maybe.just(i))
+    assert execute(v.take(one).map(just)) == Vec.create(Maybe.just(one))
+
+
+def test_fold() -> None:
+    add = Abstraction[Integer, Abstraction[Integer, Integer]].from_fn(
+        lambda acc: Abstraction[Integer, Integer].from_fn(lambda x: x * two + acc)
+    )
+    assert execute(v.fold(one, add)) == Integer.from_int(21)
+    maximum = Abstraction[Integer, Abstraction[Integer, Integer]].from_fn(
+        lambda acc: Abstraction[Integer, Integer].from_fn(
+            lambda x: (acc < x).if_(x, acc)
+        )
+    )
+    assert execute(v.fold(zero, maximum)) == Integer.from_int(4)
+
+
+def test_select() -> None:
+    every_other = Selection.create_slice(one, Integer.infinity(), two)
+    assert execute(v.select(every_other)) == packed(2, 4)
+    indices = Selection.create_indices(Vec.create(Integer.from_int(3), zero))
+    assert execute(v.select(indices)) == packed(4, 1)
+
+
+def test_set() -> None:
+    assert execute(v.append(zero)) == packed(1, 2, 3, 4, 0)
+    assert execute(v.set(one, zero)) == packed(1, 0, 3, 4)
+
+
+def test_convert() -> None:
+    array = Int64Array(numpy.arange(3))
+    assert execute(Converter[Vec[Integer]].convert(array)) == Maybe.just(
+        PackedVec.create(array)
+    )
+
+
+def test_large() -> None:
+    n = 1_000_000
+    double = Abstraction[Integer, Integer].from_fn(lambda i: i * two)
+    add = Abstraction[Integer, Abstraction[Integer, Integer]].from_fn(
+        lambda acc: Abstraction[Integer, Integer].from_fn(lambda x: acc + x)
+    )
+    vec = PackedVec.create(Int64Array(numpy.arange(n)))
+    assert execute(vec.map(double).fold(zero, add)) == Integer.from_int(n * (n - 1))
+
+
+def test_overflow() -> None:
+    """
+    Arithmetic which doesn't fit in an int64 should give the same results as on the
+    unpacked vector, instead of wrapping around.
+    """
+    big = 2 ** 62
+    unpacked = Vec[Integer].create(Integer.from_int(big), Integer.from_int(big))
+    add = Abstraction[Integer, Abstraction[Integer, Integer]].from_fn(
+        lambda acc: Abstraction[Integer, Integer].from_fn(lambda x: acc + x)
+    )
+    times_four = Abstraction[Integer, Integer].from_fn(
+        lambda x: x * Integer.from_int(4)
+    )
+    for v in [packed(big, big), unpacked]:
+        assert execute(v.fold(zero, add)) == Integer.from_int(2 ** 63)
+        assert execute(v.map(times_four).fold(zero, add)) == Integer.from_int(2 ** 65)
+        assert execute(v.map(times_four)[zero]) == Integer.from_int(2 ** 64)
+    smallest = packed(-(2 ** 63))
+    minus_one = Abstraction[Integer, Integer].from_fn(
+        lambda x: x // Integer.from_int(-1)
+    )
+    assert execute(smallest.map(minus_one)[zero]) == Integer.from_int(2 ** 63)
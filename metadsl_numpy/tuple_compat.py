@@ -20,7 +20,7 @@ T = typing.TypeVar("T")
 U = typing.TypeVar("U")
 
 
-class HomoTupleCompat(Expression, typing.Generic[T, U]):
+class HomoTupleCompat(MutableExpression, typing.Generic[T, U]):
     """
     Should follow Python API for tuple with homogoneous types. 
 
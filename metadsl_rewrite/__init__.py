@@ -9,6 +9,8 @@ from .normalize import *  # type: ignore
 from .rules import *  # type: ignore
 from .strategies import *  # type: ignore
 from .combinators import *  # type: ignore
+from .compiled import *  # type: ignore
+from .cache import *  # type: ignore
 
 
 strategy = StrategyNormalize()
@@ -21,6 +23,8 @@ export_from(
     "rules",
     "strategies",
     "combinators",
+    "compiled",
+    "cache",
     local=["execute", "register"],
 )
 
@@ -0,0 +1,87 @@
+"""
+Caches the normal forms of expressions, so executing the same expression again only
+costs a lookup.
+"""
+
+from __future__ import annotations
+
+import collections
+import dataclasses
+import typing
+
+from metadsl import *
+
+__all__ = ["NormalFormCache"]
+
+# The hash of an expression and the fingerprint of the strategy that normalized it
+Key = typing.Tuple[Hash, typing.Hashable]
+
+
+@dataclasses.dataclass
+class NormalFormCache:
+    """
+    A size bounded mapping of expression hashes to their normal forms, which evicts
+    the least recently used entries first.
+
+    >>> cache = NormalFormCache(maxsize=1)
+    >>> cache.set("a", "strategy", 1, 2)
+    >>> cache.get("a", "strategy")
+    2
+    >>> cache.set("b", "strategy", 3, 4)
+    >>> cache.get("a", "strategy")
+    Traceback (most recent call last):
+    ...
+    KeyError: ('a', 'strategy')
+    >>> cache.hits, cache.misses, len(cache)
+    (1, 1, 1)
+    """
+
+    maxsize: typing.Optional[int] = 1024
+    hits: int = 0
+    misses: int = 0
+    # Keep the original expression around, along with its normal form, so that any values
+    # hashed by their id stay alive, and their ids are not reused.
+    _entries: typing.OrderedDict[Key, typing.Tuple[object, object]] = dataclasses.field(
+        default_factory=collections.OrderedDict, repr=False
+    )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, hash_: Hash, fingerprint: typing.Hashable) -> object:
+        """
+        Returns the normal form for this hash, raising a KeyError if it isn't cached.
+
+        It is copied if it is a mutable expression.
+        """
+        key = (hash_, fingerprint)
+        try:
+            _, normal_form = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            raise
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return copy_mutable(normal_form)
+
+    def set(
+        self,
+        hash_: Hash,
+        fingerprint: typing.Hashable,
+        expr: object,
+        normal_form: object,
+    ) -> None:
+        """
+        Records the normal form of an expression. A mutable normal form is copied, so
+        it can be mutated afterwards, but the original expression is kept as is, and
+        should not be mutated.
+        """
+        key = (hash_, fingerprint)
+        self._entries[key] = (expr, copy_mutable(normal_form))
+        self._entries.move_to_end(key)
+        if self.maxsize is not None and len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.hits = self.misses = 0
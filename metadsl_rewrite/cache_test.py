@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from metadsl import *
+
+from . import *
+from .rules_test import _add_rule, _from_int, _Number
+
+
+class TestNormalFormCache:
+    def test_strategy_normalize(self):
+        cache = NormalFormCache()
+        strategy = StrategyNormalize(cache=cache)
+        strategy.phases["add"].add(_add_rule)
+        execute = Executor(strategy)
+
+        expr = _from_int(1) + _from_int(2)
+        assert execute(expr) == _from_int(3)
+        assert (cache.hits, cache.misses) == (0, 1)
+        assert execute(expr) == _from_int(3)
+        assert execute(_from_int(1) + _from_int(2)) == _from_int(3)
+        assert (cache.hits, cache.misses) == (2, 1)
+        # The input is not mutated, and neither is the cached normal form
+        assert expr == _from_int(1) + _from_int(2)
+
+        # Normal forms are cached too
+        assert execute(_from_int(3)) == _from_int(3)
+        assert execute(_from_int(3)) == _from_int(3)
+        assert (cache.hits, cache.misses) == (3, 2)
+
+    def test_strategies_changed(self):
+        cache = NormalFormCache()
+        strategy = StrategyNormalize(cache=cache)
+        execute = Executor(strategy)
+
+        expr = _from_int(1) + _from_int(2)
+        assert execute(expr) == expr
+        strategy.phases["add"].add(_add_rule)
+        assert execute(expr) == _from_int(3)
+        assert (cache.hits, cache.misses) == (0, 2)
+
+    def test_maxsize(self):
+        cache = NormalFormCache(maxsize=1)
+        execute = Executor(StrategyNormalize(cache=cache))
+        execute(_from_int(1))
+        execute(_Number.NaN())
+        execute(_from_int(1))
+        assert (cache.hits, cache.misses, len(cache)) == (0, 3, 1)
+
+    def test_shared(self):
+        cache = NormalFormCache()
+        strategy = StrategyNormalize(cache=cache)
+        strategy.phases["add"].add(_add_rule)
+        execute = Executor(strategy)
+
+        # Each level is shared, so the graph is small even though the tree is huge
+        x = _Number.NaN() + _from_int(1)
+        for _ in range(16):
+            x = x + x
+        assert execute(x) == x
+        assert execute(x) == x
+        assert (cache.hits, cache.misses) == (1, 1)
@@ -36,6 +36,9 @@ class StrategyLabel(Strategy):
     def optimize(self, executor, strategy):
         self.strategy.optimize(executor, strategy)
 
+    def heads(self):
+        return self.strategy.heads()
+
 
 @dataclasses.dataclass(init=False)
 class StrategyInOrder(Strategy):
@@ -58,43 +61,88 @@ class StrategyInOrder(Strategy):
         for strategy_ in self.strategies:
             strategy_.optimize(executor, strategy)
 
+    def heads(self):
+        return union_heads(self.strategies)
+
 
 @dataclasses.dataclass(init=False)
 class StrategySequence(Strategy):
     """
     Returns a new replacement strategy that tries each of the replacement strategies in sequence, returning the result of the first that matches.
+
+    Only the strategies whose `heads` could match the top level function
+    of the expression are tried. These are looked up once per function and then cached.
     """
 
     strategies: typing.Tuple[Strategy, ...]
+    # Mapping of head key to the strategies which could match it, in order.
+    _candidates: typing.Dict[
+        typing.Hashable, typing.Tuple[Strategy, ...]
+    ] = dataclasses.field(init=False, repr=False, compare=False)
 
     def __init__(self, *strategies: Strategy):
         self.strategies = strategies
+        self._candidates = {}
 
     def __call__(self, expr: ExpressionReference) -> typing.Iterable[Result]:
-        for strategy in self.strategies:
+        for strategy in self.candidates(expr.expression):
             for replacement in strategy(expr):
                 yield replacement
                 return
 
+    def candidates(self, expr: object) -> typing.Tuple[Strategy, ...]:
+        """
+        Returns the strategies which could match this expression.
+        """
+        key = head_key(expr)
+        try:
+            return self._candidates[key]
+        except KeyError:
+            pass
+        except TypeError:
+            # If the function is not hashable, we have to try all of them
+            return self.strategies
+        candidates: typing.List[Strategy] = []
+        for strategy in self.strategies:
+            heads = strategy.heads()
+            if heads is None or key in heads:
+                candidates.append(strategy)
+        res = self._candidates[key] = tuple(candidates)
+        return res
+
     def optimize(self, executor, strategy):
         for strategy_ in self.strategies:
             strategy_.optimize(executor, strategy)
 
+    def heads(self):
+        return union_heads(self.strategies)
+
 
 @dataclasses.dataclass
 class StrategyFold(Strategy):
     """
     Returns the first replacement found by starting at the top of the expression tree
     and then recursing down into its leaves.
+
+    It remembers the hashes of the nodes the strategy did not replace, so that when it is repeated,
+    only the nodes that have changed since, the new nodes and their ancestors, are tried again.
     """
 
     strategy: Strategy
+    # Hashes of nodes which the strategy has already been tried on and did not match
+    _no_match: typing.Set[Hash] = dataclasses.field(
+        default_factory=set, init=False, repr=False, compare=False
+    )
 
     def __call__(self, expr: ExpressionReference) -> typing.Iterable[Result]:
         for child_ref in expr.descendents:
+            hash_ = child_ref.hash
+            if hash_ in self._no_match:
+                continue
             for replacement in self.strategy(child_ref):
                 yield replacement
                 return
+            self._no_match.add(hash_)
 
     def optimize(self, executor, strategy):
         self.strategy.optimize(executor, strategy)
@@ -126,3 +174,18 @@ class StrategyRepeat(Strategy):
         Apply passed in strategy repeatedly.
         """
         self.strategy.optimize(executor, self)
+
+
+def union_heads(
+    strategies: typing.Iterable[Strategy],
+) -> typing.Optional[typing.FrozenSet[typing.Hashable]]:
+    """
+    Returns all the heads of the strategies, or None if any of them could match anything.
+    """
+    heads: typing.Set[typing.Hashable] = set()
+    for strategy in strategies:
+        strategy_heads = strategy.heads()
+        if strategy_heads is None:
+            return None
+        heads.update(strategy_heads)
+    return frozenset(heads)
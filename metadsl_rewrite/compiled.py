@@ -0,0 +1,211 @@
+"""
+Compiles a number of rules into one strategy, so that we don't have to try every rule
+on every expression.
+
+All the templates of the rules are merged into a discrimination tree, which is walked
+once per expression to find the templates that could match it. Those candidates are then
+checked with the usual `match_expression`, so the tree only has to be conservative: it can return
+templates that end up not matching, but it should never leave out one that would.
+"""
+from __future__ import annotations
+
+import dataclasses
+import typing
+
+from metadsl import *
+
+from .combinators import union_heads
+from .rules import NoMatch, Rule
+from .strategies import *
+
+__all__ = ["CompiledRules", "DiscriminationTree"]
+
+# A pending list of terms to visit, as a linked list of (first, rest) pairs
+Pending = typing.Optional[typing.Tuple[object, typing.Any]]
+
+T = typing.TypeVar("T")
+
+
+@dataclasses.dataclass
+class _Node(typing.Generic[T]):
+    # Edges for wildcards, which skip over a whole term
+    star: typing.Optional[_Node[T]] = None
+    # Edges for expressions, keyed on (head key, number of args, kwarg keys)
+    functions: typing.Dict[typing.Hashable, _Node[T]] = dataclasses.field(
+        default_factory=dict
+    )
+    # Edges for expressions with an iterated placeholder in their args, keyed on the
+    # head key. Their args are not indexed.
+    variadic: typing.Dict[typing.Hashable, _Node[T]] = dataclasses.field(
+        default_factory=dict
+    )
+    # Edges for hashable literal values
+    values: typing.Dict[typing.Hashable, _Node[T]] = dataclasses.field(
+        default_factory=dict
+    )
+    # Edge for unhashable literal values, which could match any literal
+    leaf: typing.Optional[_Node[T]] = None
+    # Values for templates which end at this node
+    items: typing.List[T] = dataclasses.field(default_factory=list)
+
+
+def _child(node: typing.Optional[_Node[T]]) -> _Node[T]:
+    return _Node() if node is None else node
+
+
+@dataclasses.dataclass
+class DiscriminationTree(typing.Generic[T]):
+    """
+    A trie over the pre-order traversal of templates.
+
+    >>> tree = DiscriminationTree()
+    >>> tree.insert([], 1, "one")
+    >>> tree.insert([], 2, "two")
+    >>> tree.lookup(1)
+    ['one']
+    """
+
+    root: _Node[T] = dataclasses.field(default_factory=_Node)
+
+    def insert(
+        self, wildcards: typing.List[Expression], template: object, item: T
+    ) -> None:
+        """
+        Adds a template to the tree, returning `item` when it could match.
+        """
+        node = self.root
+        pending: Pending = (template, None)
+        while pending is not None:
+            term, pending = pending
+            node, pending = self._insert_term(wildcards, node, term, pending)
+        node.items.append(item)
+
+    def _insert_term(
+        self,
+        wildcards: typing.List[Expression],
+        node: _Node[T],
+        term: object,
+        pending: Pending,
+    ) -> typing.Tuple[_Node[T], Pending]:
+        if term in wildcards:
+            node.star = _child(node.star)
+            return node.star, pending
+        if not isinstance(term, Expression):
+            try:
+                return node.values.setdefault(term, _Node()), pending  # type: ignore
+            except TypeError:
+                node.leaf = _child(node.leaf)
+                return node.leaf, pending
+        try:
+            key = head_key(term)
+            hash(key)
+        except TypeError:
+            # Treat functions we cannot index as wildcards
+            node.star = _child(node.star)
+            return node.star, pending
+        if any(isinstance(arg, IteratedPlaceholder) for arg in term.args):
+            return node.variadic.setdefault(key, _Node()), pending
+        kwarg_keys = tuple(sorted(term.kwargs))
+        for arg in reversed([*term.args, *(term.kwargs[k] for k in kwarg_keys)]):
+            pending = (arg, pending)
+        return (
+            node.functions.setdefault((key, len(term.args), kwarg_keys), _Node()),
+            pending,
+        )
+
+    def lookup(self, expr: object) -> typing.List[T]:
+        """
+        Returns the items of all the templates which could match this expression.
+        """
+        found: typing.List[T] = []
+        self._lookup(self.root, (expr, None), found)
+        return found
+
+    def _lookup(
+        self, node: _Node[T], pending: Pending, found: typing.List[T]
+    ) -> None:
+        if pending is None:
+            found.extend(node.items)
+            return
+        term, rest = pending
+        if node.star is not None:
+            self._lookup(node.star, rest, found)
+        if not isinstance(term, Expression):
+            if node.leaf is not None:
+                self._lookup(node.leaf, rest, found)
+            if not node.values:
+                return
+            try:
+                child = node.values.get(term)  # type: ignore
+            except TypeError:
+                # If the value isn't hashable, we can't look it up, so follow all the values
+                for child in node.values.values():
+                    self._lookup(child, rest, found)
+                return
+            if child is not None:
+                self._lookup(child, rest, found)
+            return
+
+        try:
+            key = head_key(term)
+            hash(key)
+        except TypeError:
+            # If the function isn't hashable, it could only match a wildcard
+            return
+        if node.variadic:
+            child = node.variadic.get(key)
+            if child is not None:
+                self._lookup(child, rest, found)
+        if not node.functions:
+            return
+        kwarg_keys = tuple(sorted(term.kwargs)) if term.kwargs else ()
+        child = node.functions.get((key, len(term.args), kwarg_keys))
+        if child is None:
+            return
+        for arg in reversed([*term.args, *(term.kwargs[k] for k in kwarg_keys)]):
+            rest = (arg, rest)
+        self._lookup(child, rest, found)
+
+
+@dataclasses.dataclass(init=False)
+class CompiledRules(Strategy):
+    """
+    Tries each of the rules in sequence, like `StrategySequence`, but only those whose
+    templates could match the expression according to a discrimination tree of all of them.
+    """
+
+    rules: typing.Tuple[Rule, ...]
+    # Each template is stored as the index of its rule and of its result in that rule
+    tree: DiscriminationTree[typing.Tuple[int, int]] = dataclasses.field(
+        repr=False, compare=False
+    )
+
+    def __init__(self, *rules: Rule):
+        self.rules = rules
+        self.tree = DiscriminationTree()
+        for i, rule in enumerate(rules):
+            for j, (template, _) in enumerate(rule.results):
+                self.tree.insert(rule.wildcards, template, (i, j))
+
+    def __call__(self, ref: ExpressionReference) -> typing.Iterable[Result]:
+        expr = ref.expression
+        candidates = self.tree.lookup(expr)
+        if not candidates:
+            return
+        # Try them in the same order as the rules, and their results, were passed in
+        for i, j in sorted(set(candidates)):
+            rule = self.rules[i]
+            try:
+                result_expr, logs = call_traced(rule.match, expr, j)
+            except NoMatch:
+                continue
+            ref.replace(result_expr)
+            yield Result(name=rule.result_name(j), logs=logs)
+            return
+
+    def optimize(self, executor, strategy):
+        for rule in self.rules:
+            rule.optimize(executor, strategy)
+
+    def heads(self):
+        return union_heads(self.rules)
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import typing
+
+from metadsl import *
+
+from . import *
+from .rules_test import _add_rule, _from_int, _List, _Number
+
+T = typing.TypeVar("T")
+
+
+@rule
+def _concat_lists(ls: typing.Sequence[T], rs: typing.Sequence[T]) -> R[_List[T]]:
+    return (
+        _List[T].create(*ls) + _List[T].create(*rs),
+        _List[T].create(*ls, *rs),
+    )
+
+
+@rule
+def _add_zero(x: _Number) -> R[_Number]:
+    return (x + _from_int(0), x)
+
+
+class TestDiscriminationTree:
+    def test_lookup(self):
+        tree: DiscriminationTree[int] = DiscriminationTree()
+        for i, r in enumerate([_add_rule, _add_zero, _concat_lists]):
+            for template, _ in r.results:
+                tree.insert(r.wildcards, template, i)
+
+        assert tree.lookup(_from_int(1) + _from_int(2)) == [0]
+        assert tree.lookup(_Number.NaN() + _from_int(0)) == [1]
+        assert sorted(tree.lookup(_from_int(1) + _from_int(0))) == [0, 1]
+        assert tree.lookup(_List.create(1) + _List.create(2, 3)) == [2]
+        assert tree.lookup(_Number.NaN() + _Number.NaN()) == []
+        assert tree.lookup(_from_int(1)) == []
+        assert tree.lookup(1) == []
+
+
+class TestCompiledRules:
+    def test_execute(self):
+        compiled = CompiledRules(_add_rule, _add_zero, _concat_lists)
+        assert execute(_from_int(1) + _from_int(2), compiled) == _from_int(3)
+        assert execute(_Number.NaN() + _from_int(0), compiled) == _Number.NaN()
+        assert execute(
+            _List.create(1, 2) + _List.create(3), compiled
+        ) == _List[int].create(1, 2, 3)
+
+    def test_order(self):
+        """
+        If more than one rule matches, the first one passed in should win, like `StrategySequence`.
+        """
+
+        def first_result(*rules):
+            ref = ExpressionReference.from_expression(_from_int(1) + _from_int(0))
+            (result,) = CompiledRules(*rules)(ref)
+            return result.name
+
+        assert first_result(_add_rule, _add_zero) == str(_add_rule)
+        assert first_result(_add_zero, _add_rule) == str(_add_zero)
@@ -8,7 +8,10 @@ import contextlib
 
 from metadsl import *
 from .strategies import *
+from .cache import *
 from .combinators import *
+from .compiled import *
+from .rules import Rule
 
 __all__ = ["StrategyNormalize", "Registrator"]
 
@@ -69,7 +72,12 @@ class StrategyNormalize(Strategy):
     A strategy combinator that expresses strategies in a number of phases. Each phase can
     execute strategies in all the phases before it. After each phase has no more matches,
     a label is set. This lets you explore when each phase is done executing.
-    
+
+    If `compile_rules` is set, the rules in each sequence are compiled together with
+    `CompiledRules`, instead of being tried one by one.
+
+    If a `cache` is set, the normal form of each expression is recorded in it, and looked up
+    before normalizing an expression again.
     """
 
     pre: typing.Set[Strategy] = dataclasses.field(default_factory=set)
@@ -77,9 +85,52 @@ class StrategyNormalize(Strategy):
     phases: typing.DefaultDict[str, typing.Set[Strategy]] = dataclasses.field(
         default_factory=lambda: collections.defaultdict(set)
     )
+    compile_rules: bool = False
+    cache: typing.Optional[NormalFormCache] = dataclasses.field(
+        default=None, compare=False
+    )
+    # Mapping of the rules in a sequence to their compiled version, so they are
+    # only compiled once
+    _compiled: typing.Dict[typing.FrozenSet[Rule], CompiledRules] = dataclasses.field(
+        default_factory=dict, repr=False, compare=False
+    )
 
     def __call__(self, expr: ExpressionReference) -> typing.Iterable[Result]:
-        return self.strategy(expr)
+        if self.cache is None:
+            return self.strategy(expr)
+        return self._call_cached(expr, self.cache)
+
+    def _call_cached(
+        self, expr: ExpressionReference, cache: NormalFormCache
+    ) -> typing.Iterable[Result]:
+        hash_ = expr.hash
+        fingerprint = self.fingerprint
+        try:
+            normal_form = cache.get(hash_, fingerprint)
+        except KeyError:
+            pass
+        else:
+            expr.replace(normal_form)
+            if expr.hash != hash_:
+                yield Result(name="NormalFormCache")
+            return
+        original = expr.expression
+        yield from self.strategy(expr)
+        cache.set(hash_, fingerprint, original, expr.expression)
+
+    @property
+    def fingerprint(self) -> typing.Hashable:
+        """
+        Returns a key for all the strategies in this normalization.
+        """
+        return (
+            frozenset(self.pre),
+            frozenset(self.post),
+            tuple(
+                (label, frozenset(strategies))
+                for label, strategies in self.phases.items()
+            ),
+        )
 
     def optimize(self, executor: Executor, strategy: Strategy) -> None:
         self.strategy.optimize(executor, strategy)
@@ -96,6 +147,21 @@ class StrategyNormalize(Strategy):
         #     )
         # return dataclasses.replace(self, phases=new_phases)
 
+    def sequence(self, strategies: typing.Iterable[Strategy]) -> Strategy:
+        """
+        Returns a strategy that tries each of the strategies in sequence.
+        """
+        if not self.compile_rules:
+            return StrategySequence(*strategies)
+        rules: typing.List[Rule] = []
+        others: typing.List[Strategy] = []
+        for strategy in strategies:
+            (rules if isinstance(strategy, Rule) else others).append(strategy)  # type: ignore
+        key = frozenset(rules)
+        if key not in self._compiled:
+            self._compiled[key] = CompiledRules(*rules)
+        return StrategySequence(self._compiled[key], *others)
+
     @property
     def phase_strategies(self) -> typing.Iterable[Strategy]:
         current_strategies: typing.Set[Strategy] = set()
@@ -105,8 +171,8 @@ class StrategyNormalize(Strategy):
                 label,
                 StrategyRepeat(
                     StrategySequence(
-                        StrategyFold(StrategySequence(*self.pre)),
-                        StrategyFold(StrategySequence(*current_strategies)),
+                        StrategyFold(self.sequence(self.pre)),
+                        StrategyFold(self.sequence(current_strategies)),
                     )
                 ),
             )
@@ -116,9 +182,9 @@ class StrategyNormalize(Strategy):
         return StrategyRepeat(
             StrategyInOrder(
                 StrategyLabel(
-                    "pre", StrategyRepeat(StrategyFold(StrategySequence(*self.pre)))
+                    "pre", StrategyRepeat(StrategyFold(self.sequence(self.pre)))
                 ),
                 *self.phase_strategies,
-                StrategyLabel("post", StrategyFold(StrategySequence(*self.post)))
+                StrategyLabel("post", StrategyFold(self.sequence(self.post)))
             )
         )
@@ -45,7 +45,7 @@ class NoMatch(Exception):
     pass
 
 
-def rule(fn: MatchFunctionType) -> Strategy:
+def rule(fn: MatchFunctionType) -> Rule:
     """
     Creates a new strategy given a callable that accepts wildcards and returns
     the match value and the replacement value.
@@ -81,6 +81,9 @@ class DefaultRule(Strategy):
         # TODO: Implement optimizations for default rules
         pass
 
+    def heads(self):
+        return frozenset({function_key(self.fn)})
+
     def __call__(self, ref: ExpressionReference) -> typing.Iterable[Result]:
         """
         This strategy should match whenever the expression is this function.
@@ -89,47 +92,54 @@ class DefaultRule(Strategy):
         and apply it to the return value. This is so that if the body uses generic type
         variables, they are turned into the actual instantiations. 
         """
-        with CaptureLogging() as results:
-            expr = ref.expression
+        try:
+            result, logs = call_traced(self.replacement, ref.expression)
+        except NoMatch:
+            return
+        ref.replace(result)
+        yield Result(str(self), logs=logs)
+
+    def replacement(self, expr: object) -> object:
+        """
+        Returns the replacement for the expression, or raises `NoMatch` if it does not match.
+        """
+        if tracing.enabled:
             logger.debug("DefaultRule.__call__ self=%s expr=%s", self, expr)
-            if not isinstance(expr, Expression):
-                return
+        if not isinstance(expr, Expression):
+            raise NoMatch
 
-            fn = self.fn
+        fn = self.fn
 
-            args = expr.args
+        args = expr.args
 
-            # If any of the args are placeholders, don't match!
-            if any(
-                isinstance(arg, PlaceholderExpression)
-                for arg in args + list(expr.kwargs.values())
-            ):
-                return None
-
-            typevars: TypeVarMapping = infer_return_type(
-                expr.function.fn,  # type: ignore
-                getattr(expr.function, "owner", None),
-                getattr(expr.function, "is_classmethod", False),
-                tuple(args),
-                expr.kwargs,
-            )[-1]
-            if isinstance(fn, BoundInfer) and isinstance(expr.function, BoundInfer):
-                if fn.fn != expr.function.fn:
-                    return None
-                if fn.is_classmethod:
-                    args = [
-                        typing.cast(object, replace_typevars(typevars, fn.owner))
-                    ] + args
-
-            elif fn != expr.function:
-                return None
-            with TypeVarScope(*typevars.keys()):
-                new_expr = self.inner_fn(*args, **expr.kwargs)
-                result = ReplaceTypevarsExpression(typevars)(new_expr)
-            logger.debug("DefaultRule.__call__ result=%s", result)
+        # If any of the args are placeholders, don't match!
+        if any(
+            isinstance(arg, PlaceholderExpression)
+            for arg in args + list(expr.kwargs.values())
+        ):
+            raise NoMatch
 
-            ref.replace(result)
-        yield Result(str(self), logs="\n".join(results))
+        typevars: TypeVarMapping = infer_return_type(
+            expr.function.fn,  # type: ignore
+            getattr(expr.function, "owner", None),
+            getattr(expr.function, "is_classmethod", False),
+            tuple(args),
+            expr.kwargs,
+        )[-1]
+        if isinstance(fn, BoundInfer) and isinstance(expr.function, BoundInfer):
+            if fn.fn != expr.function.fn:
+                raise NoMatch
+            if fn.is_classmethod:
+                args = [typing.cast(object, replace_typevars(typevars, fn.owner))] + args
+
+        elif fn != expr.function:
+            raise NoMatch
+        with TypeVarScope(*typevars.keys()):
+            new_expr = self.inner_fn(*args, **expr.kwargs)
+            result = ReplaceTypevarsExpression(typevars)(new_expr)
+        if tracing.enabled:
+            logger.debug("DefaultRule.__call__ result=%s", result)
+        return result
 
 
 class Wildcard(Expression, typing.Generic[T]):
@@ -168,39 +178,77 @@ class Rule(Strategy):
     the input args with the nodes at their locations in the template.
 
     You can also return None from the strategy to signal that it won't match.
+
+    The templates are only created the first time they are needed, so that defining rules is cheap.
     """
 
     matchfunction: MatchFunctionType
 
     # the wildcards that are present in the template
-    wildcards: typing.List[Expression] = dataclasses.field(
-        init=False, hash=False, compare=False
+    _wildcards: typing.List[Expression] = dataclasses.field(
+        init=False, hash=False, compare=False, repr=False
     )
 
-    results: typing.List[R] = dataclasses.field(init=False, hash=False, compare=False)
+    _results: typing.List[R] = dataclasses.field(
+        init=False, hash=False, compare=False, repr=False
+    )
+
+    # The head keys of the templates, or None if one of them is a wildcard
+    _heads: typing.Optional[typing.FrozenSet[typing.Hashable]] = dataclasses.field(
+        init=False, hash=False, compare=False, repr=False
+    )
+
+    # Whether the templates have been created yet
+    _created: bool = dataclasses.field(
+        default=False, init=False, hash=False, compare=False, repr=False
+    )
 
     def __str__(self):
         return f"{self.matchfunction.__module__}.{self.matchfunction.__qualname__}"
 
     def __post_init__(self):
         functools.update_wrapper(self, self.matchfunction)
+
+    @property
+    def wildcards(self) -> typing.List[Expression]:
+        if not self._created:
+            self._create_templates()
+        return self._wildcards
+
+    @property
+    def results(self) -> typing.List[R]:
+        if not self._created:
+            self._create_templates()
+        return self._results
+
+    def _create_templates(self) -> None:
         # Create one wildcard` per argument
-        self.wildcards = [create_wildcard(a) for a in get_arg_hints(self.matchfunction)]
+        wildcards = [create_wildcard(a) for a in get_arg_hints(self.matchfunction)]
 
         # we match the wildcards against themselves to get an identity typevar mapping
         # TODO: Replace with just grabbing all typevars from arg types themselves
-        typevars_in_args = match_values(
-            tuple(self.wildcards), tuple(self.wildcards)
-        ).keys()
-        # Set the typevar args in scope so when functions are called here they are recorded properly
-        with TypeVarScope(*typevars_in_args):
+        typevars_in_args = match_values(tuple(wildcards), tuple(wildcards)).keys()
+        # Set the typevar args in scope so when functions are called here they are recorded properly.
+        # Start from an empty scope, since this can be called while executing some other rule.
+        with NewTypeVarScope(), TypeVarScope(*typevars_in_args):
             # Call the function first to create a template with the wildcards
-            result = self.matchfunction(*self.wildcards)
-            self.results = (
+            result = self.matchfunction(*wildcards)
+            results = (
                 list(result)  # type: ignore
                 if inspect.isgeneratorfunction(self.matchfunction)
                 else [result]
             )
+        templates = [template for template, _ in results]
+        try:
+            heads = (
+                None
+                if any(template in wildcards for template in templates)
+                else frozenset(head_key(template) for template in templates)
+            )
+        except TypeError:
+            heads = None
+        self._wildcards, self._results, self._heads = wildcards, results, heads
+        self._created = True
 
     def optimize(self, executor: Executor, strategy: Strategy) -> None:
         new_results: typing.List[R] = []
@@ -211,61 +259,75 @@ class Rule(Strategy):
             if not isinstance(expression_thunk, types.FunctionType):
                 self.results[i] = (template, executor(expression_thunk, strategy))
 
+    def heads(self):
+        if not self._created:
+            self._create_templates()
+        return self._heads
+
     def __call__(self, ref: ExpressionReference) -> typing.Iterable[Result]:
         expr = ref.expression
-        with CaptureLogging() as logs:
-            logger.debug("Rule.__call__ self=%s expr=%s", self, expr)
-            for i, result in enumerate(self.results):
-                template, expression_thunk = result
-                try:
-                    logger.debug("Trying to match against %s", template)
-                    typevars, wildcards_to_nodes = match_expression(  # type: ignore
-                        self.wildcards, template, expr
-                    )
-                except NoMatch:
-                    logger.debug("Not a match")
-                    continue
-                logger.debug(
-                    "Matched expr=%s typevars=%s", wildcards_to_nodes, typevars
-                )
-                # if the result is a function, we can't use substitution, so instead we re-call
-                # with args and use that result
-                if isinstance(expression_thunk, types.FunctionType):
-                    args = [
-                        wildcards_to_nodes.get(wildcard, wildcard)
-                        for wildcard in self.wildcards
-                    ]
-                    with TypeVarScope(*typevars.keys()):
-                        _, expression_thunk = (
-                            list(self.matchfunction(*args))[i]
-                            if inspect.isgeneratorfunction(self.matchfunction)
-                            else self.matchfunction(*args)
-                        )
-                        # If it's a function, make sure we have real values instead of placeholders
-                        # for any of the nodes that are placeholders for something more specific
-                        # than a typevar, object, or any
-                        if any(
-                            isinstance(node, PlaceholderExpression)
-                            and not is_vague_type(wildcard_inner_type(wildcard))
-                            for wildcard, node in wildcards_to_nodes.items()
-                        ):
-                            continue
-                        try:
-                            result_expr: object = expression_thunk()
-                        except NoMatch:
-                            continue
-                else:
-                    result_expr = ReplaceValues(wildcards_to_nodes)(expression_thunk)
-                with TypeVarScope(*typevars.keys()):
-                    result_expr = ReplaceTypevarsExpression(typevars)(result_expr)
-                logger.debug("Rule.__call__ res=%s", result_expr)
-                ref.replace(result_expr)
-                yield Result(
-                    # if there is more than one possible match from this strategy, also put the index of the match
-                    name=str(self) if len(self.results) == 1 else f"{self}[{i}]",
-                    logs="\n".join(logs),
+        for i in range(len(self.results)):
+            try:
+                result_expr, logs = call_traced(self.match, expr, i)
+            except NoMatch:
+                continue
+            ref.replace(result_expr)
+            yield Result(name=self.result_name(i), logs=logs)
+            return
+
+    def result_name(self, i: int) -> str:
+        # if there is more than one possible match from this strategy, also put the index of the match
+        return str(self) if len(self.results) == 1 else f"{self}[{i}]"
+
+    def match(self, expr: object, i: int) -> object:
+        """
+        Matches the expression against the `i`th template of this rule and returns the replacement.
+
+        Raises `NoMatch` if it does not match.
+        """
+        template, expression_thunk = self.results[i]
+        try:
+            if tracing.enabled:
+                logger.debug("Rule.match self=%s expr=%s", self, expr)
+                logger.debug("Trying to match against %s", template)
+            typevars, wildcards_to_nodes = match_expression(  # type: ignore
+                self.wildcards, template, expr
+            )
+        except NoMatch:
+            if tracing.enabled:
+                logger.debug("Not a match")
+            raise
+        if tracing.enabled:
+            logger.debug("Matched expr=%s typevars=%s", wildcards_to_nodes, typevars)
+        # if the result is a function, we can't use substitution, so instead we re-call
+        # with args and use that result
+        if isinstance(expression_thunk, types.FunctionType):
+            args = [
+                wildcards_to_nodes.get(wildcard, wildcard) for wildcard in self.wildcards
+            ]
+            with TypeVarScope(*typevars.keys()):
+                _, expression_thunk = (
+                    list(self.matchfunction(*args))[i]
+                    if inspect.isgeneratorfunction(self.matchfunction)
+                    else self.matchfunction(*args)
                 )
-                return
+                # If it's a function, make sure we have real values instead of placeholders
+                # for any of the nodes that are placeholders for something more specific
+                # than a typevar, object, or any
+                if any(
+                    isinstance(node, PlaceholderExpression)
+                    and not is_vague_type(wildcard_inner_type(wildcard))
+                    for wildcard, node in wildcards_to_nodes.items()
+                ):
+                    raise NoMatch
+                result_expr: object = expression_thunk()
+        else:
+            result_expr = ReplaceValues(wildcards_to_nodes)(expression_thunk)
+        with TypeVarScope(*typevars.keys()):
+            result_expr = ReplaceTypevarsExpression(typevars)(result_expr)
+        if tracing.enabled:
+            logger.debug("Rule.__call__ res=%s", result_expr)
+        return result_expr
 
 
 @dataclasses.dataclass
@@ -351,29 +413,38 @@ def match_expression(
 
     A wildcard can match either an expression or a value. If it matches two nodes, they must be equal.
     """
-    logger.debug(
-        "match_expression wildcards=%s template=%s expr=%s", wildcards, template, expr
-    )
-    if template in wildcards:
+    if tracing.enabled:
         logger.debug(
-            "template is a wildcard, matching expr to template to get typevars"
+            "match_expression wildcards=%s template=%s expr=%s",
+            wildcards,
+            template,
+            expr,
         )
+    if template in wildcards:
+        if tracing.enabled:
+            logger.debug(
+                "template is a wildcard, matching expr to template to get typevars"
+            )
         # Match type of wildcard with type of expression
         try:
             res = (
                 match_values(template, expr),
                 UnhashableMapping(Item(typing.cast(Expression, template), expr)),
             )
-            logger.debug("got wildcard mapping %s", res)
+            if tracing.enabled:
+                logger.debug("got wildcard mapping %s", res)
             return res
         except TypeError:
-            logger.debug("could not match types")
+            if tracing.enabled:
+                logger.debug("could not match types")
             raise NoMatch
 
     if isinstance(expr, Expression):
-        logger.debug("value is expression")
+        if tracing.enabled:
+            logger.debug("value is expression")
         if not isinstance(template, Expression):
-            logger.debug("...but template isn't so no match")
+            if tracing.enabled:
+                logger.debug("...but template isn't so no match")
             raise NoMatch
         # Any typevars in the template that are unbound should be matched with their
         # versions in the expr
@@ -383,11 +454,14 @@ def match_expression(
                 template.function, expr.function
             )
         except TypeError:
-            logger.debug("could not match functions")
+            if tracing.enabled:
+                logger.debug("could not match functions")
             raise NoMatch
-        logger.debug("matched functions to get typevar_apping=%s", fn_type_mapping)
+        if tracing.enabled:
+            logger.debug("matched functions to get typevar_apping=%s", fn_type_mapping)
         if set(expr.kwargs.keys()) != set(template.kwargs.keys()):
-            logger.debug("No match because typevars not same keys")
+            if tracing.enabled:
+                logger.debug("No match because typevars not same keys")
             raise TypeError("Wrong kwargs in match")
 
         template_args: typing.Iterable[object]
@@ -444,7 +518,8 @@ def match_expression(
                 ),
             )
         ) or ((), ())
-        logger.debug("Matched args and kwargs")
+        if tracing.enabled:
+            logger.debug("Matched args and kwargs")
         try:
             merged_typevars: TypeVarMapping = merge_typevars(
                 fn_type_mapping, *type_mappings
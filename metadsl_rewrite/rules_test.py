@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import logging
 import typing
 
 import pytest
@@ -344,6 +345,17 @@ class TestRule:
             == 0
         )
 
+    def test_logs(self, monkeypatch, caplog):
+        ref = ExpressionReference.from_expression(_from_int(1) + _from_int(2))
+        (result,) = _add_rule(ref)
+        assert result.logs == ""
+
+        caplog.set_level(logging.DEBUG)
+        monkeypatch.setattr(tracing, "enabled", True)
+        ref = ExpressionReference.from_expression(_from_int(1) + _from_int(2))
+        (result,) = _add_rule(ref)
+        assert "Matched" in result.logs
+
 
 class TestDefaultRule:
     def test_fn(self):
@@ -530,3 +542,42 @@ class TestDefaultRule:
                 ...
 
         globals()["C"] = C
+
+
+class TestStrategySequence:
+    def test_candidates(self):
+        @rule
+        def _wildcard_rule(a: _Number) -> R[_Number]:
+            return a, a
+
+        from_int_rule = default_rule(_from_int)
+        sequence = StrategySequence(_add_rule, from_int_rule, _wildcard_rule)
+
+        assert sequence.candidates(_from_int(1) + _from_int(2)) == (
+            _add_rule,
+            _wildcard_rule,
+        )
+        assert sequence.candidates(_from_int(1)) == (from_int_rule, _wildcard_rule)
+        assert sequence.candidates(_Number.NaN()) == (_wildcard_rule,)
+        assert sequence.candidates(1) == (_wildcard_rule,)
+
+
+class TestStrategyFold:
+    def test_skips_unchanged(self):
+        tried: typing.List[object] = []
+
+        def _record(ref: ExpressionReference) -> typing.Iterable[Result]:
+            tried.append(ref.expression)
+            return _add_rule(ref)
+
+        expr = (_from_int(1) + _from_int(2)) + _Number.NaN()
+        fold = StrategyFold(_record)  # type: ignore
+        ref = ExpressionReference.from_expression(expr)
+        assert list(fold(ref))
+        assert len(tried) == 6
+        tried.clear()
+
+        # After the replacement only the new nodes and their ancestor are tried again
+        assert not list(fold(ref))
+        assert tried == [3, _from_int(3), _from_int(3) + _Number.NaN()]
+        assert ref.expression == _from_int(3) + _Number.NaN()
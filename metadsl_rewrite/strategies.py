@@ -11,8 +11,9 @@ from __future__ import annotations
 import typing
 import dataclasses
 from metadsl import *
+from metadsl.typing_tools import *
 
-__all__ = ["Strategy", "Executor", "Result"]
+__all__ = ["Strategy", "Executor", "Result", "head_key", "function_key"]
 
 T = typing.TypeVar("T")
 
@@ -34,6 +35,8 @@ class Executor:
     execute: typing.Callable[
         [ExpressionReference, Strategy], object
     ] = dataclasses.field(default=_execute_all)
+    # How often to check the integrity of the expression graph, defaults to `metadsl.normalized.DEFAULT_VERIFICATION`
+    verification: typing.Optional[Verification] = None
 
     def __call__(self, expr: T, strategy: typing.Optional[Strategy] = None) -> T:
         execute: typing.Callable[  # type: ignore
@@ -45,7 +48,12 @@ class Executor:
         return typing.cast(
             T,
             execute(
-                ExpressionReference.from_expression(clone_expression(expr)), strategy
+                # Expressions are never changed in place, so only a mutable one has
+                # to be copied, so that changing it later does not change the graph
+                ExpressionReference.from_expression(
+                    copy_mutable(expr), self.verification
+                ),
+                strategy,
             ),
         )
 
@@ -73,10 +81,55 @@ class Strategy(typing.Protocol):
         """
         ...
 
+    def heads(self) -> typing.Optional[typing.FrozenSet[typing.Hashable]]:
+        """
+        Returns the `head_key`s of all the expressions this strategy could replace,
+        or None if it could replace any expression.
+
+        This is used to skip strategies which could never match an expression.
+        """
+        return None
+
 
 class NoOpStrategy(Strategy):
     def __call__(self, ref):
         return tuple()
 
+    def heads(self):
+        return frozenset()
+
     def optimize(self, executor, strategy):
         pass
+
+
+class _Leaf:
+    """
+    Key for all values which are not expressions.
+    """
+
+    def __repr__(self):
+        return "LEAF"
+
+
+LEAF = _Leaf()
+
+
+def head_key(expr: object) -> typing.Hashable:
+    """
+    Returns a key for the top level function of an expression.
+
+    Two expressions can only match if they have the same key, so methods
+    are keyed by their underlying function, regardless of their owner.
+    """
+    if not isinstance(expr, Expression):
+        return LEAF
+    return function_key(expr.function)
+
+
+def function_key(fn: object) -> typing.Hashable:
+    """
+    Returns the `head_key` of expressions with this function.
+    """
+    if isinstance(fn, BoundInfer):
+        return fn.fn
+    return typing.cast(typing.Hashable, fn)
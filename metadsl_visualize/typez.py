@@ -10,7 +10,6 @@ import types
 import typing
 import warnings
 
-import black
 import metadsl
 import typing_inspect
 from typez import *
@@ -78,7 +77,13 @@ class ExpressionDisplay:
         self.typez_display._ipython_display_()
 
 
-black_file_mode = black.FileMode(line_length=40)
+def format_function(source: str) -> str:
+    """
+    Formats the function string with black, which is only imported once we need it.
+    """
+    import black
+
+    return black.format_str(source, mode=black.FileMode(line_length=40))
 
 
 def convert_to_nodes(ref: metadsl.ExpressionReference) -> Nodes:
@@ -98,9 +103,8 @@ def convert_to_nodes(ref: metadsl.ExpressionReference) -> Nodes:
                     metadsl.typing_tools.get_fn_typevars(value.function)
                 )
                 or None,
-                function=black.format_str(
-                    f"{func_str}\n{value._type_str}" if SHOW_TYPES else func_str,
-                    mode=black_file_mode,
+                function=format_function(
+                    f"{func_str}\n{value._type_str}" if SHOW_TYPES else func_str
                 ),
                 args=[str(a) for a in children.args] or None,
                 kwargs={k: str(v) for k, v in children.kwargs.items()} or None,
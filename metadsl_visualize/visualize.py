@@ -1,7 +1,6 @@
+import sys
 import typing
 
-import IPython
-import IPython.core.display
 from metadsl import *
 from metadsl_rewrite import *
 
@@ -20,10 +19,9 @@ def execute_and_visualize(ref: ExpressionReference, strategy: Strategy) -> objec
     expression_display = ExpressionDisplay(ref)
 
     # Only display expressions if in notebook, not in shell
-    if (
-        IPython.get_ipython()
-        and IPython.get_ipython().__class__.__name__ == "ZMQInteractiveShell"
-    ):
+    if _get_ipython().__class__.__name__ == "ZMQInteractiveShell":
+        import IPython.core.display
+
         IPython.core.display.display(expression_display)
 
     # Update the typez display as we execute the strategys
@@ -38,7 +36,7 @@ def monkeypatch():
     """
     Expression._ipython_display_ = _expression_ipython_display  # type: ignore
     # only change if we are in a kernel
-    if IPython.get_ipython():
+    if _get_ipython():
         execute.execute = execute_and_visualize  # type: ignore
 
 
@@ -46,7 +44,19 @@ def _expression_ipython_display(self):
     res = execute(self)
     # Only display result if we get back a non expression object
     if not isinstance(res, Expression):
+        import IPython.core.display
+
         IPython.core.display.display(res)
 
 
+def _get_ipython() -> object:
+    """
+    Returns the current IPython shell, without importing IPython if it hasn't been already,
+    since then we cannot be running in one.
+    """
+    if "IPython" not in sys.modules:
+        return None
+    return sys.modules["IPython"].get_ipython()  # type: ignore
+
+
 monkeypatch()
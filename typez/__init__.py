@@ -7,9 +7,10 @@ from dataclasses import dataclass
 import dataclasses
 from typing import *
 import json
-import jsonschema
 import pathlib
-import IPython.core.display
+
+if TYPE_CHECKING:
+    import IPython.core.display
 
 __all__ = [
     "Typez",
@@ -196,6 +197,8 @@ class TypezDisplay:
     )
 
     def _ipython_display_(self):
+        import IPython.core.display
+
         self._handle = IPython.core.display.display(self.typez, display_id=True)
 
     @property  # type: ignore